@@ -0,0 +1,167 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+from delivery import TokenBucket, MAX_TRACKED_CHATS
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов к LLM выполняется одновременно и сколько может ждать в очереди
+MAX_ACTIVE_REQUESTS = 8
+MAX_QUEUED_REQUESTS = 64
+
+# Частота запросов к LLM от одного пользователя: в среднем USER_REQUESTS_PER_MINUTE
+# в минуту и до USER_BURST запросов подряд
+USER_REQUESTS_PER_MINUTE = 6
+USER_BURST = 3
+
+
+class AdmissionRejected(Exception):
+    """
+    Запрос к LLM не принят: пользователь превысил свою частоту запросов
+    (reason="user_rate") или очередь заполнена (reason="queue_full").
+    """
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Допуск запросов к LLM. Одновременно выполняется не больше max_active
+    запросов, остальные ждут в очереди не длиннее max_queued: при заполненной
+    очереди запрос сразу отклоняется, чтобы пользователь быстро получил ответ
+    "попробуйте позже", а не ждал тайм-аута. Ожидающие запросы хранятся в
+    отдельной очереди для каждого чата, и освободившееся место отдается чатам
+    по кругу, поэтому чат, отправивший много сообщений, не задерживает
+    остальных. Кроме того, частота запросов каждого пользователя ограничена
+    token bucket, чтобы один пользователь не израсходовал квоту Gemini API.
+    """
+
+    def __init__(
+        self,
+        max_active: int = MAX_ACTIVE_REQUESTS,
+        max_queued: int = MAX_QUEUED_REQUESTS,
+        user_rate: float = USER_REQUESTS_PER_MINUTE / 60,
+        user_burst: float = USER_BURST,
+        metrics: Metrics | None = None,
+    ):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.metrics = metrics
+        self.user_buckets = OrderedDict()
+        # Чат -> очередь ожидающих запросов; порядок чатов задает очередность обслуживания по кругу
+        self.queues = OrderedDict()
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self.user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            while len(self.user_buckets) > MAX_TRACKED_CHATS:
+                self.user_buckets.popitem(last=False)
+        else:
+            self.user_buckets.move_to_end(user_id)
+        return bucket
+
+    def _reject(self, reason: str, retry_after: float = 0.0) -> AdmissionRejected:
+        self.rejected += 1
+        if self.metrics is not None:
+            self.metrics.inc('bot_admission_rejected_total', reason=reason)
+        return AdmissionRejected(reason, retry_after)
+
+    def _update_depth(self) -> None:
+        if self.metrics is not None:
+            self.metrics.set_gauge('bot_admission_queue_depth', self.queued)
+
+    async def _acquire(self, user_id: int, chat_id: int) -> None:
+        bucket = self._user_bucket(user_id)
+        wait = bucket.delay()
+        if wait > 0:
+            raise self._reject('user_rate', wait)
+        # Токен забирается сразу, чтобы запросы пользователя, ожидающие в очереди, тоже учитывались
+        bucket.tokens -= 1
+
+        start = time.perf_counter()
+        if self.active < self.max_active and not self.queues:
+            self.active += 1
+        else:
+            if self.queued >= self.max_queued:
+                bucket.tokens += 1 # Отклоненный из-за нагрузки запрос не расходует частоту пользователя
+                raise self._reject('queue_full')
+            future = asyncio.get_running_loop().create_future()
+            self.queues.setdefault(chat_id, deque()).append(future)
+            self.queued += 1
+            self._update_depth()
+            try:
+                # Место освобождает _release: он сам увеличивает active перед тем, как разбудить запрос
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    self._discard(chat_id, future)
+                raise
+        self.admitted += 1
+        if self.metrics is not None:
+            self.metrics.observe('bot_admission_wait_seconds', time.perf_counter() - start)
+
+    def _discard(self, chat_id: int, future: asyncio.Future) -> None:
+        """Убирает из очереди запрос, обработка которого была отменена."""
+        queue = self.queues.get(chat_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.queues[chat_id]
+            self._update_depth()
+
+    def _release(self) -> None:
+        """Освобождает место и передает его первому запросу следующего по кругу чата."""
+        self.active -= 1
+        while self.queues and self.active < self.max_active:
+            chat_id, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.queues.move_to_end(chat_id)
+            else:
+                del self.queues[chat_id]
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+        self._update_depth()
+
+    async def run(self, user_id: int, chat_id: int, fn):
+        """
+        Выполняет запрос к LLM после допуска.
+
+        Аргументы:
+        user_id (int): Идентификатор пользователя (для ограничения частоты).
+        chat_id (int): Идентификатор чата (для очередности обслуживания).
+        fn: Функция без аргументов, возвращающая корутину запроса.
+
+        Возвращает:
+        Результат запроса.
+
+        Исключения:
+        AdmissionRejected: Если запрос не принят.
+        """
+        await self._acquire(user_id, chat_id)
+        try:
+            return await fn()
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Возвращает число выполняющихся, ожидающих, принятых и отклоненных запросов."""
+        return {'active': self.active, 'queued': self.queued, 'admitted': self.admitted, 'rejected': self.rejected}
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Запоминаем последнюю вычисленную версию корпуса, чтобы не хэшировать тексты на каждое сообщение
+_version_memo = {}
+
+
+def normalize_question(question: str) -> str:
+    """
+    Нормализует вопрос для использования в качестве ключа кэша: нижний регистр,
+    "е" вместо "ё", без знаков препинания и лишних пробелов.
+
+    Аргументы:
+    question (str): Вопрос пользователя.
+
+    Возвращает:
+    str: Нормализованный вопрос.
+    """
+    return " ".join(PUNCTUATION_RE.sub(" ", question.lower().replace("ё", "е")).split())
+
+
+def corpus_version(texts: dict) -> str:
+    """
+    Вычисляет версию содержимого учебных планов. Версия стабильна между
+    перезапусками (SHA-256 текстов), а повторные вызовы для тех же строк
+    не пересчитывают хэш: ключом мемоизации служат встроенные хэши строк,
+    которые Python кэширует в самих объектах.
+
+    Аргументы:
+    texts (dict): Словарь {имя PDF-файла: извлеченный текст}.
+
+    Возвращает:
+    str: Версия корпуса.
+    """
+    memo_key = tuple(sorted((name, len(text), hash(text)) for name, text in texts.items()))
+    version = _version_memo.get(memo_key)
+    if version is None:
+        digest = hashlib.sha256()
+        for name in sorted(texts):
+            digest.update(name.encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(texts[name].encode('utf-8'))
+            digest.update(b'\0')
+        version = digest.hexdigest()[:16]
+        _version_memo.clear()
+        _version_memo[memo_key] = version
+    return version
+
+
+class AnswerCache:
+    """
+    Кэш ответов LLM с вытеснением по LRU и времени жизни записей.
+    Ключом служит нормализованный вопрос; при изменении версии учебных планов
+    кэш полностью сбрасывается. Может сохраняться на диск между перезапусками.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        """Загружает сохраненные записи, пропуская устаревшие."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш ответов {self.path}: {e}")
+            return
+        self.version = data.get('version')
+        now = time.time()
+        for key, created, answer in data.get('entries', []):
+            if now - created < self.ttl:
+                self.entries[key] = (created, answer)
+        logger.info(f"Загружено {len(self.entries)} записей кэша ответов из {self.path}")
+
+    def save(self) -> None:
+        """Сохраняет кэш на диск, если задан путь."""
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'version': self.version,
+                    'entries': [[key, created, answer] for key, (created, answer) in self.entries.items()],
+                }, file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш ответов {self.path}: {e}")
+
+    def _check_version(self, version: str) -> None:
+        """Сбрасывает кэш, если изменилась версия учебных планов."""
+        if version != self.version:
+            if self.entries:
+                logger.info(f"Учебные планы изменились, кэш ответов ({len(self.entries)} записей) сброшен.")
+            self.entries.clear()
+            self.version = version
+
+    def get(self, question: str, version: str) -> str | None:
+        """
+        Возвращает сохраненный ответ на вопрос.
+
+        Аргументы:
+        question (str): Вопрос пользователя.
+        version (str): Текущая версия учебных планов.
+
+        Возвращает:
+        str | None: Ответ или None, если его нет в кэше или он устарел.
+        """
+        self._check_version(version)
+        key = normalize_question(question)
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self.entries[key]
+            self.evictions += 1
+        self.misses += 1
+        return None
+
+    def put(self, question: str, version: str, answer: str) -> None:
+        """
+        Сохраняет ответ на вопрос, вытесняя давно не использовавшиеся записи.
+
+        Аргументы:
+        question (str): Вопрос пользователя.
+        version (str): Версия учебных планов, по которым получен ответ.
+        answer (str): Ответ LLM.
+        """
+        if self.version is not None and version != self.version:
+            # Ответ получен по старой версии учебных планов, которые уже обновились
+            return
+        self.version = version
+        key = normalize_question(question)
+        self.entries[key] = (time.time(), answer)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Возвращает счетчики попаданий, промахов и вытеснений."""
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
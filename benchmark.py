@@ -0,0 +1,341 @@
+"""
+Нагрузочное тестирование и микробенчмарки бота.
+
+Нагрузочный тест вызывает handle_message для синтетических обновлений Telegram
+с заданной конкурентностью. Вместо Gemini API используется локальный сервер
+с настраиваемой задержкой и долей ошибок, вместо Telegram - объекты сообщений,
+которые только запоминают отправленный текст.
+
+Примеры:
+    python benchmark.py load --requests 500 --concurrency 50 --latency 0.3 --error-rate 0.02
+    python benchmark.py load --streaming --scheduler
+    python benchmark.py micro --repeat 5
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+
+import bot
+from pdf_processor import extract_text_from_pdf, process_study_plans
+from reloader import build_corpus
+
+# Вопросы для синтетических обновлений. Чтобы запросы не объединялись и не
+# попадали в кэш, к ним добавляется номер абитуриента (кроме режима --repeat-questions).
+# Фактические вопросы (часы, трудоемкость, дисциплины семестра) бот отвечает по таблице
+# дисциплин без LLM, поэтому здесь только вопросы, которые доходят до Gemini.
+QUESTIONS = (
+    "Чем отличаются программы Искусственный интеллект и AI Product?",
+    "Какие есть элективы по машинному обучению?",
+    "Есть ли в программе курсы по управлению продуктом?",
+    "Какую программу выбрать, если я хочу заниматься исследованиями?",
+    "Подойдет ли программа AI Product выпускнику без опыта программирования?",
+    "Какие элективы посоветуете бэкенд-разработчику?",
+)
+
+# Текст ответа фиктивного Gemini
+FAKE_ANSWER = "В учебном плане есть подходящие дисциплины. " * 20
+
+
+class FakeGeminiServer:
+    """
+    Локальный HTTP-сервер, имитирующий методы generateContent и
+    streamGenerateContent Gemini API с заданной задержкой и долей ошибок 503.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, error_rate: float = 0.0, stream_chunks: int = 5):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_chunks = stream_chunks
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                request_line, *headers = head.decode("latin-1").split("\r\n")
+                length = next((int(h.split(":", 1)[1]) for h in headers if h.lower().startswith("content-length:")), 0)
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+                if random.random() < self.error_rate:
+                    self.errors += 1
+                    await self._respond(writer, "503 Service Unavailable", "application/json", b'{"error": {"code": 503}}')
+                elif "streamGenerateContent" in request_line:
+                    await self._respond_stream(writer)
+                else:
+                    body = json.dumps({"candidates": [{"content": {"parts": [{"text": FAKE_ANSWER}]}}]}).encode()
+                    await self._respond(writer, "200 OK", "application/json", body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: str, content_type: str, body: bytes) -> None:
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _respond_stream(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        piece = len(FAKE_ANSWER) // self.stream_chunks + 1
+        for start in range(0, len(FAKE_ANSWER), piece):
+            event = {"candidates": [{"content": {"parts": [{"text": FAKE_ANSWER[start:start + piece]}]}}]}
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.latency / self.stream_chunks)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class FakeMessage:
+    """Сообщение Telegram, которое запоминает ответы вместо их отправки."""
+
+    def __init__(self, text: str = "", latency: float = 0.0):
+        self.text = text
+        self.latency = latency
+        self.replies = []
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.replies.append(text)
+        return FakeMessage(text, self.latency)
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.text = text
+        return self
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.first_name = f"user{user_id}"
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class FakeUpdate:
+    """Минимальный аналог telegram.Update с полями, которые использует бот."""
+
+    def __init__(self, user_id: int, text: str, telegram_latency: float = 0.0):
+        self.message = FakeMessage(text, telegram_latency)
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeChat(user_id)
+
+
+class FakeContext:
+    """Минимальный аналог ContextTypes.DEFAULT_TYPE: обработчикам нужен только bot_data."""
+
+    def __init__(self, bot_data: dict):
+        self.bot_data = bot_data
+
+
+class LoopStallMonitor:
+    """
+    Измеряет задержки цикла событий: периодически засыпает на interval секунд
+    и считает, насколько позже запланированного он просыпается.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stalls = []
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.stalls.append(max(0.0, time.perf_counter() - start - self.interval))
+
+
+def percentile(values: list, p: float) -> float:
+    """Возвращает p-й процентиль списка значений."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run_load_test(args: argparse.Namespace) -> None:
+    """Запускает нагрузочный тест handle_message."""
+    study_plan_texts = process_study_plans(args.pdf_dir)
+    if not study_plan_texts:
+        print(f"В директории {args.pdf_dir} нет учебных планов, нагрузочный тест невозможен.")
+        return
+
+    server = FakeGeminiServer(args.latency, args.jitter, args.error_rate)
+    await server.start()
+    # bot_data собирается так же, как при запуске бота (допуск, история разговоров,
+    # метрики и т.д.), но с параметрами теста
+    os.environ.update({
+        'GEMINI_API_BASE': server.base_url,
+        'GEMINI_MAX_CONCURRENCY': str(args.llm_concurrency),
+        'GEMINI_MAX_RETRIES': str(args.max_retries),
+        'GEMINI_STREAMING': "1" if args.streaming else "0",
+    })
+    bot_data = bot.build_bot_data("benchmark")
+    bot_data.update(build_corpus(study_plan_texts))
+    llm_client = bot_data['llm_client']
+    llm_client.backoff_base = 0.05
+    if not args.cache:
+        bot_data['answer_cache'] = None
+    if not args.scheduler:
+        del bot_data['outbound_scheduler']
+    # Как и при запуске бота (warm_up), пул соединений создается заранее, вне измерений
+    await llm_client.open()
+    context = FakeContext(bot_data)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # Задержки отдельно для вопросов, отвеченных по таблице дисциплин, и для дошедших до LLM
+    latencies = {'course_table': [], 'llm': []}
+    course_table = bot_data['course_table']
+
+    async def one_request(user_id: int) -> None:
+        question = random.choice(QUESTIONS)
+        if not args.repeat_questions:
+            question = f"{question} (абитуриент {user_id})"
+        source = 'course_table' if course_table.answer(question) else 'llm'
+        update = FakeUpdate(user_id, question, args.telegram_latency)
+        async with semaphore:
+            start = time.perf_counter()
+            await bot.handle_message(update, context)
+            latencies[source].append(time.perf_counter() - start)
+
+    monitor = LoopStallMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request(user_id) for user_id in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    await llm_client.aclose()
+    await server.stop()
+
+    print(f"Запросов: {args.requests}, конкурентность: {args.concurrency}, "
+          f"задержка Gemini: {args.latency} с., доля ошибок: {args.error_rate}")
+    print(f"Время: {elapsed:.2f} с., пропускная способность: {args.requests / elapsed:.1f} запросов/с")
+    for source, values in latencies.items():
+        if values:
+            print(f"Задержка ответа ({source}, {len(values)} запросов): p50={percentile(values, 50):.3f} с., "
+                  f"p99={percentile(values, 99):.3f} с., max={max(values):.3f} с.")
+    print(f"Задержки цикла событий: max={max(monitor.stalls, default=0) * 1000:.1f} мс, "
+          f"p99={percentile(monitor.stalls, 99) * 1000:.1f} мс, всего={sum(monitor.stalls):.3f} с.")
+    print(f"Запросов к Gemini: {server.requests} (ошибок {server.errors}), "
+          f"объединение запросов: {bot_data['single_flight'].stats()}")
+    print(f"Допуск запросов к LLM: {bot_data['admission'].stats()}")
+    print(bot_data['metrics'].summary())
+
+
+def time_call(fn, repeat: int) -> tuple:
+    """Выполняет fn repeat раз и возвращает минимальное и медианное время."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def run_micro_benchmarks(args: argparse.Namespace) -> None:
+    """Запускает микробенчмарки извлечения текста и отправки длинных сообщений."""
+    pdf_files = sorted(name for name in os.listdir(args.pdf_dir) if name.lower().endswith(".pdf"))
+    if not pdf_files:
+        print(f"В директории {args.pdf_dir} нет PDF-файлов.")
+        return
+
+    def report(name: str, timings: tuple) -> None:
+        print(f"{name:<55} min={timings[0] * 1000:9.1f} мс  median={timings[1] * 1000:9.1f} мс")
+
+    for filename in pdf_files:
+        pdf_path = os.path.join(args.pdf_dir, filename)
+        report(f"extract_text_from_pdf({filename})", time_call(lambda: extract_text_from_pdf(pdf_path), args.repeat))
+    report("process_study_plans(use_cache=False, max_workers=1)",
+           time_call(lambda: process_study_plans(args.pdf_dir, use_cache=False, max_workers=1), args.repeat))
+    report("process_study_plans(use_cache=False)",
+           time_call(lambda: process_study_plans(args.pdf_dir, use_cache=False), args.repeat))
+    process_study_plans(args.pdf_dir) # Заполняем кэш извлечения
+    report("process_study_plans(use_cache=True)", time_call(lambda: process_study_plans(args.pdf_dir), args.repeat))
+
+    # Отправка длинного ответа: весь текст учебных планов, разбитый на сообщения
+    long_text = "\n\n".join(process_study_plans(args.pdf_dir).values())
+
+    def send_long() -> None:
+        update = FakeUpdate(1, "")
+        asyncio.run(bot.send_long_message(update, long_text))
+
+    report(f"send_long_message({len(long_text)} симв.)", time_call(send_long, args.repeat))
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Нагрузочное тестирование и микробенчмарки бота.")
+    arg_parser.add_argument("--pdf-dir", default="study_plans", help="Директория с PDF-файлами учебных планов")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    load = subparsers.add_parser("load", help="Нагрузочный тест handle_message")
+    load.add_argument("--requests", type=int, default=200, help="Количество синтетических сообщений")
+    load.add_argument("--concurrency", type=int, default=20, help="Количество одновременно обрабатываемых сообщений")
+    load.add_argument("--latency", type=float, default=0.5, help="Средняя задержка ответа Gemini (с.)")
+    load.add_argument("--jitter", type=float, default=0.1, help="Разброс задержки ответа Gemini (с.)")
+    load.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов Gemini с ошибкой 503")
+    load.add_argument("--telegram-latency", type=float, default=0.0, help="Задержка отправки сообщения в Telegram (с.)")
+    load.add_argument("--llm-concurrency", type=int, default=8, help="Максимум одновременных запросов к Gemini")
+    load.add_argument("--max-retries", type=int, default=3, help="Количество повторов запроса к Gemini")
+    load.add_argument("--streaming", action="store_true", help="Использовать потоковый режим ответа")
+    load.add_argument("--scheduler", action="store_true", help="Отправлять ответы через OutboundScheduler")
+    load.add_argument("--cache", action="store_true", help="Использовать кэш ответов")
+    load.add_argument("--repeat-questions", action="store_true", help="Не делать вопросы уникальными")
+
+    micro = subparsers.add_parser("micro", help="Микробенчмарки извлечения текста и отправки сообщений")
+    micro.add_argument("--repeat", type=int, default=3, help="Количество повторов каждого измерения")
+
+    args = arg_parser.parse_args()
+    # Логи отдельных запросов искажают измерения
+    logging.disable(logging.WARNING)
+    if args.command == "load":
+        asyncio.run(run_load_test(args))
+    else:
+        run_micro_benchmarks(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,28 @@
 import os
+import time
+STARTED_AT = time.perf_counter() # Начало импорта модулей - для отчета о времени запуска
+import math
+import random
+import asyncio
 import logging
+from functools import partial
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv # Для загрузки переменных окружения из .env
-import requests # Для HTTP-запросов к Gemini API
+import httpx # Для обработки ошибок HTTP-запросов к Gemini API
 import json # Для работы с JSON-ответами
-import PyPDF2 # Для извлечения текста из PDF
+from pdf_processor import process_study_plans # Общий движок извлечения текста из PDF
+from reloader import StudyPlanWatcher, build_corpus, DEFAULT_RELOAD_INTERVAL # Поисковый индекс, таблица дисциплин и их обновление без перезапуска
+from llm_client import GeminiClient, GEMINI_API_BASE # Асинхронный клиент Gemini API
+from answer_cache import AnswerCache, corpus_version # Кэш ответов LLM
+from streaming import StreamingReply # Потоковый вывод ответа с редактированием сообщения
+from singleflight import SingleFlight, flight_key # Объединение одинаковых одновременных запросов к LLM
+from delivery import OutboundScheduler, split_message, GLOBAL_MESSAGES_PER_SECOND, CHAT_MESSAGES_PER_SECOND # Очередь исходящих сообщений
+from retrieval import estimate_tokens # Оценка размера промпта в токенах
+from recommender import format_recommendation # Подбор программы и дисциплин по выбору без LLM
+from conversation import ConversationStore, is_follow_up, HISTORY_TOKEN_BUDGET, SUMMARY_TOKEN_BUDGET, MAX_CHATS, MAX_STORED_CHARS, IDLE_TTL # История разговоров по чатам
+from admission import AdmissionController, AdmissionRejected, MAX_QUEUED_REQUESTS, USER_REQUESTS_PER_MINUTE, USER_BURST # Допуск запросов к LLM
+from metrics import Metrics, MetricsServer, StartupReport, payload_digest, SIZE_BUCKETS # Метрики задержек и счетчики
 
 # Логирование для отладки
 logging.basicConfig(
@@ -19,98 +36,56 @@ logger = logging.getLogger(__name__)
 # Максимальная длина сообщения для Telegram (4096 символов), оставляем небольшой запас
 TELEGRAM_MAX_MESSAGE_LENGTH = 4000 
 
-# --- Функции для извлечения текста из PDF ---
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """
-    Извлекает весь текст из PDF-файла.
+# Количество фрагментов учебных планов и бюджет токенов контекста LLM по умолчанию.
+# Переопределяются переменными окружения RETRIEVAL_TOP_K и CONTEXT_TOKEN_BUDGET.
+DEFAULT_RETRIEVAL_TOP_K = 8
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
 
-    Аргументы:
-    pdf_path (str): Путь к PDF-файлу.
+# Доля запросов к Gemini, payload которых записывается в лог целиком (PAYLOAD_LOG_SAMPLE_RATE).
+# Для остальных запросов в лог попадают только размер и отпечаток промпта.
+DEFAULT_PAYLOAD_LOG_SAMPLE_RATE = 0.0
 
-    Возвращает:
-    str: Весь извлеченный текст из PDF.
-    """
-    text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            num_pages = len(reader.pages)
-            for page_num in range(num_pages):
-                page = reader.pages[page_num]
-                text += page.extract_text()
-        logger.info(f"Текст успешно извлечен из {pdf_path}")
-    except FileNotFoundError:
-        logger.error(f"Ошибка: Файл не найден по пути {pdf_path}")
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении текста из {pdf_path}: {e}")
-    return text
-
-def process_study_plans(pdf_dir="study_plans") -> dict:
-    """
-    Обрабатывает все PDF-файлы в указанной директории и извлекает из них текст.
-
-    Аргументы:
-    pdf_dir (str): Директория, содержащая PDF-файлы учебных планов.
-
-    Возвращает:
-    dict: Словарь, где ключами являются имена файлов PDF, а значениями - извлеченный текст.
-    """
-    extracted_texts = {}
-    if not os.path.exists(pdf_dir):
-        logger.warning(f"Директория {pdf_dir} не найдена. Убедитесь, что PDF-файлы скачаны.")
-        return extracted_texts
-
-    for filename in os.listdir(pdf_dir):
-        if filename.lower().endswith(".pdf"):
-            pdf_path = os.path.join(pdf_dir, filename)
-            logger.info(f"Обработка файла: {pdf_path}")
-            text = extract_text_from_pdf(pdf_path)
-            if text:
-                extracted_texts[filename] = text
-            else:
-                logger.warning(f"Не удалось извлечь текст из файла: {filename}")
-    return extracted_texts
-# --- Конец функций для извлечения текста из PDF ---
+# В режиме быстрого запуска (FAST_START=1) учебные планы загружаются в фоне после начала опроса Telegram.
+# Сообщение, пришедшее до окончания загрузки, ждет ее не дольше WARMUP_WAIT секунд, затем бот просит повторить вопрос.
+DEFAULT_WARMUP_WAIT = 5.0
+WARMING_UP_TEXT = "Я только что запустился и еще загружаю учебные планы. Пожалуйста, повторите вопрос через несколько секунд."
+BUSY_TEXT = "Сейчас мне задают очень много вопросов. Пожалуйста, попробуйте еще раз через минуту."
 
 # --- Вспомогательная функция для разделения длинных сообщений ---
-async def send_long_message(update: Update, text: str) -> None:
+async def send_long_message(update: Update, text: str, scheduler: OutboundScheduler | None = None, metrics: Metrics | None = None) -> None:
     """
     Разделяет длинный текст на части и отправляет их как отдельные сообщения.
+    Если передан планировщик, части отправляются через его очередь чата
+    с соблюдением ограничений Telegram на частоту сообщений. Если переданы
+    метрики, время отправки учитывается как этап delivery.
     """
-    if len(text) <= TELEGRAM_MAX_MESSAGE_LENGTH:
-        await update.message.reply_text(text)
-        return
-
-    chunks = []
-    current_chunk = ""
     # Разделяем по абзацам или предложениям для сохранения смысла
-    paragraphs = text.split('\n\n') 
-    
-    for para in paragraphs:
-        if len(current_chunk) + len(para) + 2 <= TELEGRAM_MAX_MESSAGE_LENGTH: # +2 для \n\n
-            current_chunk += (para + '\n\n')
-        else:
-            if current_chunk: # Добавляем предыдущий заполненный кусок
-                chunks.append(current_chunk.strip())
-            current_chunk = para + '\n\n' # Начинаем новый кусок
-    
-    if current_chunk: # Добавляем последний кусок
-        chunks.append(current_chunk.strip())
-
-    # Если абзацы слишком длинные, чтобы поместиться даже в один чанк,
-    # то разбиваем их посимвольно
-    final_chunks = []
-    for chunk in chunks:
-        if len(chunk) > TELEGRAM_MAX_MESSAGE_LENGTH:
-            # Разбиваем слишком длинные абзацы посимвольно
-            for i in range(0, len(chunk), TELEGRAM_MAX_MESSAGE_LENGTH):
-                final_chunks.append(chunk[i:i + TELEGRAM_MAX_MESSAGE_LENGTH])
-        else:
-            final_chunks.append(chunk)
+    chunks = split_message(text, TELEGRAM_MAX_MESSAGE_LENGTH)
+    if len(chunks) > 1:
+        chunks = [f"Часть {i+1}/{len(chunks)}:\n{chunk}" for i, chunk in enumerate(chunks)]
+
+    start = time.perf_counter()
+    if scheduler is not None:
+        await scheduler.send_chunks(update.effective_chat.id, update.message.reply_text, chunks)
+    else:
+        for chunk in chunks:
+            await update.message.reply_text(chunk)
+    if metrics is not None:
+        metrics.observe('bot_stage_seconds', time.perf_counter() - start, stage='delivery')
 
-    for i, chunk in enumerate(final_chunks):
-        await update.message.reply_text(f"Часть {i+1}/{len(final_chunks)}:\n{chunk}")
-        time.sleep(0.5) # Небольшая задержка между сообщениями, чтобы избежать флуда
+async def wait_for_corpus(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """
+    В режиме быстрого запуска ждет загрузки учебных планов не дольше WARMUP_WAIT секунд.
+    Если они так и не загрузились, просит пользователя повторить вопрос и возвращает False.
+    """
+    corpus_ready = context.bot_data.get('corpus_ready')
+    if corpus_ready is not None and not corpus_ready.is_set():
+        try:
+            await asyncio.wait_for(corpus_ready.wait(), timeout=context.bot_data.get('warmup_wait', DEFAULT_WARMUP_WAIT))
+        except asyncio.TimeoutError:
+            await update.message.reply_text(WARMING_UP_TEXT)
+            return False
+    return True
 
 # --- Обработчики команд ---
 
@@ -124,10 +99,118 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет сообщение с помощью при получении команды /help."""
-    await update.message.reply_text("Я могу отвечать на вопросы по учебным планам и программам магистратуры ИТМО. Просто напиши свой вопрос.")
+    await update.message.reply_text("Я могу отвечать на вопросы по учебным планам и программам магистратуры ИТМО. Просто напиши свой вопрос. "
+                                    "Я помню предыдущие вопросы в этом чате; команда /reset начинает разговор заново. "
+                                    "Команда /recommend с рассказом о вашем опыте подберет программу и дисциплины по выбору.")
+
+async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Очищает историю разговора в чате при получении команды /reset."""
+    conversation_store = context.bot_data.get('conversation_store')
+    if conversation_store is not None:
+        conversation_store.reset(update.effective_chat.id)
+    await update.message.reply_text("Начнем разговор заново. Задай свой вопрос.")
+
+async def recommend_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Подбирает программу и дисциплины по выбору по описанию опыта абитуриента
+    при получении команды /recommend. Подбор выполняется по векторам, заранее
+    построенным при загрузке учебных планов; LLM (если включен RECOMMEND_USE_LLM)
+    только формулирует ответ по найденным результатам.
+    """
+    background = " ".join(context.args or ())
+    if not background:
+        await update.message.reply_text("Расскажите о своем опыте и интересах после команды, например:\n"
+                                        "/recommend я backend-разработчик на Python, интересуюсь машинным обучением")
+        return
+
+    if not await wait_for_corpus(update, context):
+        return
+
+    recommender = context.bot_data.get('recommender')
+    metrics = context.bot_data.setdefault('metrics', Metrics())
+    scheduler = context.bot_data.get('outbound_scheduler')
+    if recommender is None:
+        await update.message.reply_text("Подбор программ сейчас недоступен. Задайте вопрос обычным сообщением.")
+        return
+
+    with metrics.timer('bot_stage_seconds', stage='recommend'):
+        result = recommender.recommend(background)
+    if result is None:
+        await update.message.reply_text("Не нашел в учебных планах ничего похожего на ваш опыт. "
+                                        "Опишите подробнее, чем вы занимались и что вам интересно.")
+        return
+    response_text = format_recommendation(result)
+
+    llm_client = context.bot_data.get('llm_client')
+    if context.bot_data.get('recommend_with_llm') and llm_client is not None:
+        prompt = (
+            f"Ты чат-бот, который помогает абитуриентам выбрать магистерскую программу ИТМО. "
+            f"Абитуриент описал свой опыт: {background}\n\n"
+            f"Подбор по учебным планам дал такой результат:\n{response_text}\n\n"
+            f"Коротко объясни абитуриенту, какая программа ему подходит больше и почему, и посоветуй дисциплины по выбору. "
+            f"Используй только программы и дисциплины из результата подбора."
+        )
+        try:
+            payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+            with metrics.timer('bot_stage_seconds', stage='llm'):
+                result = await run_admitted(update, context, lambda: llm_client.generate_content(payload))
+            response_text = extract_response_text(result, prompt, "", None) or response_text
+        except AdmissionRejected as e: # При нагрузке отвечаем результатом подбора без LLM
+            logger.info(f"Формулировка рекомендации через LLM отклонена ({e.reason})")
+        except Exception as e: # Без LLM ответ остается таким, как его сформировал подбор
+            logger.error(f"Ошибка при формулировке рекомендации через Gemini API: {e!r}")
+            metrics.inc('bot_errors_total', kind='llm_http' if isinstance(e, httpx.HTTPError) else 'internal')
+    metrics.inc('bot_answers_total', source='recommender')
+    await send_long_message(update, response_text, scheduler, metrics)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отправляет администратору сводку метрик бота при получении команды /stats."""
+    if update.effective_user.id not in context.bot_data.get('admin_ids', set()):
+        await update.message.reply_text("Эта команда доступна только администраторам бота.")
+        return
+
+    lines = [context.bot_data.setdefault('metrics', Metrics()).summary()]
+    answer_cache = context.bot_data.get('answer_cache')
+    if answer_cache is not None:
+        lines.append(f"Кэш ответов: {answer_cache.stats()}")
+    single_flight = context.bot_data.get('single_flight')
+    if single_flight is not None:
+        lines.append(f"Объединение запросов к LLM: {single_flight.stats()}")
+    conversation_store = context.bot_data.get('conversation_store')
+    if conversation_store is not None:
+        lines.append(f"Разговоры: {conversation_store.stats()}")
+    admission = context.bot_data.get('admission')
+    if admission is not None:
+        lines.append(f"Допуск запросов к LLM: {admission.stats()}")
+    await send_long_message(update, "\n".join(lines))
 
 # --- Обработчик текстовых сообщений ---
 
+def extract_response_text(result: dict, user_message: str, plan_version: str, answer_cache) -> str | None:
+    """
+    Извлекает текст ответа из результата generateContent и сохраняет его в кэш ответов.
+    Возвращает None, если ответ имеет неожиданную структуру.
+    """
+    # Проверяем структуру ответа от Gemini API
+    if result and result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
+        response_text = result['candidates'][0]['content']['parts'][0]['text']
+        if answer_cache is not None:
+            answer_cache.put(user_message, plan_version, response_text)
+        return response_text
+    logger.warning(f"Неожиданная структура ответа от Gemini API: {result}")
+    return None
+
+def run_admitted(update: Update, context: ContextTypes.DEFAULT_TYPE, fn):
+    """
+    Выполняет запрос к LLM через допуск (ограничение частоты пользователя и
+    очередь с обслуживанием чатов по кругу), если он настроен в bot_data.
+    Возвращает корутину; при отказе в допуске она вызывает AdmissionRejected.
+    """
+    admission = context.bot_data.get('admission')
+    if admission is None:
+        return fn()
+    return admission.run(update.effective_user.id, update.effective_chat.id, fn)
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обрабатывает текстовое сообщение пользователя, использует LLM для генерации ответа
@@ -136,76 +219,365 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_message = update.message.text
     logger.info(f"Получено сообщение от {update.effective_user.first_name}: {user_message}")
 
-    # Получаем извлеченные тексты из bot_data
+    # При быстром запуске учебные планы могут быть еще не загружены: ненадолго откладываем ответ
+    if not await wait_for_corpus(update, context):
+        return
+
+    # Получаем извлеченные тексты и построенные по ним структуры из bot_data.
+    # Ссылки берутся один раз: если учебные планы обновятся во время обработки,
+    # этот запрос доработает с прежними данными.
     study_plan_texts = context.bot_data.get('study_plan_texts', {})
-    
+    study_plan_index = context.bot_data.get('study_plan_index')
+    course_table = context.bot_data.get('course_table')
+    plan_version = context.bot_data.get('plan_version') or corpus_version(study_plan_texts)
+    metrics = context.bot_data.setdefault('metrics', Metrics())
+    scheduler = context.bot_data.get('outbound_scheduler')
+    # История разговора в этом чате: уточняющие вопросы понимаются с учетом предыдущих
+    chat_id = update.effective_chat.id
+    conversation_store = context.bot_data.get('conversation_store')
+    # История добавляется только к уточняющим вопросам: самостоятельный вопрос отвечается
+    # без нее, поэтому для него работают кэш ответов и объединение одинаковых запросов
+    history = conversation_store.history(chat_id) if conversation_store is not None and is_follow_up(user_message) else ""
+
     if not study_plan_texts:
         await update.message.reply_text("У меня пока нет информации об учебных планах. Пожалуйста, убедитесь, что PDF-файлы обработаны.")
         return
 
-    # Объединяем все тексты учебных планов в одну строку для контекста LLM
-    # В реальном приложении, если тексты очень большие, потребуется
-    # более сложная логика для выбора релевантных частей текста (например, с помощью векторизации).
-    full_context = "\n\n".join(study_plan_texts.values())
+    # Фактические вопросы (трудоемкость дисциплины, дисциплины семестра) отвечаем по таблице дисциплин без LLM
+    if course_table is not None:
+        local_answer = course_table.answer(user_message)
+        if local_answer:
+            metrics.inc('bot_answers_total', source='course_table')
+            if conversation_store is not None:
+                conversation_store.add(chat_id, user_message, local_answer)
+            await send_long_message(update, local_answer, scheduler, metrics)
+            return
+
+    # Повторяющиеся вопросы отвечаем из кэша, пока учебные планы не изменились.
+    # Ответ на вопрос, заданный в продолжение разговора, зависит от истории, поэтому кэш для него не используется.
+    answer_cache = context.bot_data.get('answer_cache') if not history else None
+    if answer_cache is not None:
+        cached_answer = answer_cache.get(user_message, plan_version)
+        if cached_answer is not None:
+            metrics.inc('bot_answers_total', source='cache')
+            if conversation_store is not None:
+                conversation_store.add(chat_id, user_message, cached_answer)
+            await send_long_message(update, cached_answer, scheduler, metrics)
+            return
+
+    # Выбираем из учебных планов только фрагменты, релевантные вопросу, в пределах бюджета токенов.
+    # Если индекс не построен, в контекст попадают все тексты учебных планов целиком.
+    with metrics.timer('bot_stage_seconds', stage='context'):
+        if study_plan_index is not None:
+            # Уточняющий вопрос ("а во втором семестре?") ищем вместе с предыдущим вопросом
+            query = f"{conversation_store.last_question(chat_id)} {user_message}" if history else user_message
+            full_context = study_plan_index.build_context(
+                query,
+                top_k=context.bot_data.get('retrieval_top_k', DEFAULT_RETRIEVAL_TOP_K),
+                token_budget=context.bot_data.get('context_token_budget', DEFAULT_CONTEXT_TOKEN_BUDGET),
+            )
+        else:
+            full_context = "\n\n".join(str(text) for text in study_plan_texts.values())
 
     # Формируем промпт для LLM
     # Важно: проинструктировать LLM отвечать только на основе предоставленного контекста
-    prompt = (
-        f"Ты чат-бот, который помогает абитуриентам разобраться в магистерских программах ИТМО. "
-        f"Отвечай на вопросы только на основе предоставленного ниже текста учебных планов. "
-        f"Если информация отсутствует в тексте, так и скажи, что не можешь ответить на этот вопрос на основе имеющихся данных. "
-        f"Вот контекст из учебных планов:\n\n{full_context}\n\n"
-        f"Вопрос абитуриента: {user_message}"
-    )
-
-    # Получаем API ключ Gemini из контекста
-    gemini_api_key = context.bot_data.get('gemini_api_key')
-    if not gemini_api_key:
+    with metrics.timer('bot_stage_seconds', stage='prompt'):
+        prompt = (
+            f"Ты чат-бот, который помогает абитуриентам разобраться в магистерских программах ИТМО. "
+            f"Отвечай на вопросы только на основе предоставленного ниже текста учебных планов. "
+            f"Если информация отсутствует в тексте, так и скажи, что не можешь ответить на этот вопрос на основе имеющихся данных. "
+            f"Вот контекст из учебных планов:\n\n{full_context}\n\n"
+        )
+        if history:
+            prompt += f"История разговора с абитуриентом:\n\n{history}\n\n"
+        prompt += f"Вопрос абитуриента: {user_message}"
+    metrics.observe('bot_prompt_chars', len(prompt), buckets=SIZE_BUCKETS)
+    metrics.observe('bot_prompt_tokens', estimate_tokens(prompt), buckets=SIZE_BUCKETS)
+
+    # Получаем клиент Gemini из контекста
+    llm_client = context.bot_data.get('llm_client')
+    if llm_client is None:
         await update.message.reply_text("Ошибка: API ключ Gemini не настроен. Пожалуйста, обратитесь к администратору бота.")
-        logger.error("API ключ Gemini не найден в bot_data.")
+        logger.error("Клиент Gemini не найден в bot_data.")
         return
 
     # Вызов Gemini API
     # Используем модель gemini-2.0-flash, как указано в инструкциях
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_api_key}"
-    
     payload = {
         "contents": [{"role": "user", "parts": [{"text": prompt}]}]
     }
 
+    # В потоковом режиме ответ показывается пользователю по мере генерации
+    streaming_reply = StreamingReply(update.message, TELEGRAM_MAX_MESSAGE_LENGTH, scheduler=scheduler, chat_id=chat_id) if context.bot_data.get('llm_streaming') else None
+
     response_text = "Извините, произошла ошибка при получении ответа от AI."
     try:
-        logger.info(f"Отправка запроса к Gemini API. Payload: {json.dumps(payload, ensure_ascii=False, indent=2)}") # Логируем payload
-        # Используем requests для вызова API
-        api_response = requests.post(api_url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
-        api_response.raise_for_status() # Вызывает исключение для ошибок HTTP (4xx или 5xx)
-        
-        result = api_response.json()
-        
-        # Проверяем структуру ответа от Gemini API
-        if result and result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
-            response_text = result['candidates'][0]['content']['parts'][0]['text']
+        # Payload целиком логируется только для доли запросов, для остальных - размер и отпечаток промпта
+        if random.random() < context.bot_data.get('payload_log_sample_rate', DEFAULT_PAYLOAD_LOG_SAMPLE_RATE):
+            logger.info(f"Отправка запроса к Gemini API. Payload: {json.dumps(payload, ensure_ascii=False)}")
         else:
-            logger.warning(f"Неожиданная структура ответа от Gemini API: {result}")
+            logger.info(f"Отправка запроса к Gemini API: промпт {len(prompt)} симв., sha1 {payload_digest(prompt)}")
+        # Одинаковые вопросы с одинаковым контекстом, заданные одновременно, разделяют один запрос к LLM
+        single_flight = context.bot_data.setdefault('single_flight', SingleFlight())
+        key = flight_key(user_message, f"{full_context}\n{history}")
+        # Запрос, которому нужен вызов LLM, проходит допуск: ограничение частоты пользователя и очередь с обслуживанием чатов по кругу.
+        # Присоединившиеся к уже выполняющемуся одинаковому запросу допуск не проходят - квоту они не расходуют.
+        # Этап llm измеряется уже после допуска, поэтому ожидание в очереди в него не входит (оно есть в bot_admission_wait_seconds).
+        if streaming_reply is not None:
+            async def call_llm():
+                # В потоковом режиме этап llm включает вывод ответа по мере генерации
+                with metrics.timer('bot_stage_seconds', stage='llm'):
+                    return await streaming_reply.consume(llm_client.stream_generate_content(payload))
+
+            response_text, shared = await single_flight.do(key, lambda: run_admitted(update, context, call_llm))
+            if response_text:
+                metrics.inc('bot_answers_total', source='llm_shared' if shared else 'llm')
+                if answer_cache is not None:
+                    answer_cache.put(user_message, plan_version, response_text)
+                if conversation_store is not None:
+                    conversation_store.add(chat_id, user_message, response_text)
+                if shared: # Ответ получен потоком другого чата, отправляем его целиком
+                    await send_long_message(update, response_text, scheduler, metrics)
+                return
+            logger.warning("Gemini API вернул пустой потоковый ответ.")
+            metrics.inc('bot_errors_total', kind='empty_response')
             response_text = "Извините, я получил некорректный ответ от AI."
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при запросе к Gemini API: {e}")
-        if api_response is not None: # Проверяем, что api_response был получен
-            logger.error(f"Текст ответа от API: {api_response.text}") # Логируем текст ответа
+        else:
+            # Запрос выполняется асинхронно и не блокирует обработку сообщений других пользователей
+            async def call_llm():
+                with metrics.timer('bot_stage_seconds', stage='llm'):
+                    return await llm_client.generate_content(payload)
+
+            result, shared = await single_flight.do(key, lambda: run_admitted(update, context, call_llm))
+            metrics.inc('bot_answers_total', source='llm_shared' if shared else 'llm')
+            response_text = extract_response_text(result, user_message, plan_version, answer_cache)
+            if response_text is None:
+                response_text = "Извините, я получил некорректный ответ от AI."
+            elif conversation_store is not None:
+                conversation_store.add(chat_id, user_message, response_text)
+
+    except AdmissionRejected as e:
+        # Отвечаем сразу, не дожидаясь очереди: ответ "попробуйте позже" лучше тайм-аута
+        logger.info(f"Запрос к LLM отклонен ({e.reason}), чат {chat_id}")
+        if e.reason == 'user_rate':
+            response_text = f"Вы задаете вопросы слишком часто. Пожалуйста, повторите вопрос через {math.ceil(e.retry_after)} с."
+        else:
+            response_text = BUSY_TEXT
+    except httpx.HTTPError as e:
+        logger.error(f"Ошибка при запросе к Gemini API: {e!r}")
+        metrics.inc('bot_errors_total', kind='llm_http')
+        if isinstance(e, httpx.HTTPStatusError): # Ответ от API был получен
+            logger.error(f"Текст ответа от API: {e.response.text}") # Логируем текст ответа
         response_text = "Извините, не удалось связаться с AI для получения ответа. Проверьте ваше интернет-соединение или API ключ."
     except json.JSONDecodeError as e:
         logger.error(f"Ошибка при парсинге JSON ответа от Gemini API: {e}")
+        metrics.inc('bot_errors_total', kind='llm_json')
         response_text = "Извините, не удалось обработать ответ от AI. Возможно, проблема с форматом данных."
     except Exception as e:
         logger.error(f"Произошла непредвиденная ошибка при обработке сообщения: {e}")
+        metrics.inc('bot_errors_total', kind='internal')
         response_text = "Извините, произошла внутренняя ошибка."
 
     # Отправляем ответ, разделяя его на части, если он слишком длинный
-    await send_long_message(update, response_text)
+    if streaming_reply is not None:
+        await streaming_reply.fail(response_text)
+    else:
+        await send_long_message(update, response_text, scheduler, metrics)
 
 # --- Основная функция запуска бота ---
 
+async def load_corpus(bot_data: dict) -> None:
+    """Загружает учебные планы в пуле потоков и отмечает их готовность (режим быстрого запуска)."""
+    try:
+        study_plan_texts = await asyncio.to_thread(process_study_plans)
+        bot_data.update(await asyncio.to_thread(build_corpus, study_plan_texts))
+        if study_plan_texts:
+            logger.info(f"Успешно загружено {len(study_plan_texts)} учебных планов.")
+        else:
+            logger.warning("Не удалось загрузить учебные планы. Бот будет работать без контекста PDF.")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке учебных планов: {e}")
+    finally:
+        bot_data['corpus_ready'].set()
+        startup_report = bot_data.get('startup_report')
+        if startup_report is not None:
+            startup_report.mark("учебные планы загружены")
+
+async def warm_up(application: Application) -> None:
+    """
+    Фоновая подготовка бота, пока уже идет опрос Telegram: загрузка учебных
+    планов (в режиме быстрого запуска), создание пула соединений Gemini вне
+    цикла событий и запуск обновления учебных планов без перезапуска.
+    """
+    bot_data = application.bot_data
+    tasks = []
+    llm_client = bot_data.get('llm_client')
+    if llm_client is not None:
+        tasks.append(llm_client.open())
+    corpus_ready = bot_data.get('corpus_ready')
+    if corpus_ready is not None and not corpus_ready.is_set():
+        tasks.append(load_corpus(bot_data))
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при подготовке бота: {result!r}")
+
+    watcher = bot_data.get('study_plan_watcher')
+    if watcher is not None:
+        watcher.start()
+    startup_report = bot_data.get('startup_report')
+    if startup_report is not None:
+        startup_report.mark("бот готов")
+        startup_report.export(bot_data.setdefault('metrics', Metrics()))
+        logger.info(f"Время запуска: {startup_report.render()}")
+
+async def on_startup(application: Application) -> None:
+    """Запускает сервер метрик и фоновую подготовку бота после его инициализации."""
+    startup_report = application.bot_data.get('startup_report')
+    if startup_report is not None:
+        startup_report.mark("инициализация завершена")
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        await metrics_server.start()
+    application.bot_data['warm_up_task'] = asyncio.create_task(warm_up(application))
+
+async def on_shutdown(application: Application) -> None:
+    """Останавливает фоновые задачи и освобождает ресурсы при остановке бота."""
+    warm_up_task = application.bot_data.get('warm_up_task')
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+        try:
+            await warm_up_task
+        except asyncio.CancelledError:
+            pass
+    watcher = application.bot_data.get('study_plan_watcher')
+    if watcher is not None:
+        await watcher.stop()
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        await metrics_server.stop()
+    # Уже поставленные в очередь ответы дописываются, после чего задачи отправки останавливаются
+    scheduler = application.bot_data.get('outbound_scheduler')
+    if scheduler is not None:
+        await scheduler.stop()
+    await close_llm_client(application)
+
+async def close_llm_client(application: Application) -> None:
+    """Закрывает пул соединений клиента Gemini и сохраняет кэш ответов при остановке бота."""
+    llm_client = application.bot_data.get('llm_client')
+    if llm_client is not None:
+        await llm_client.aclose()
+    answer_cache = application.bot_data.get('answer_cache')
+    if answer_cache is not None:
+        answer_cache.save()
+        logger.info(f"Статистика кэша ответов: {answer_cache.stats()}")
+    single_flight = application.bot_data.get('single_flight')
+    if single_flight is not None:
+        logger.info(f"Статистика объединения запросов к LLM: {single_flight.stats()}")
+
+
+def build_bot_data(gemini_api_key: str) -> dict:
+    """
+    Создает настройки и общие объекты бота для bot_data по переменным окружения:
+    кэш ответов, планировщик отправки, допуск и клиент Gemini и т.д. Используется
+    при создании приложения и в нагрузочном тесте (benchmark.py).
+
+    Аргументы:
+    gemini_api_key (str): API ключ Gemini.
+
+    Возвращает:
+    dict: Значения для bot_data без учебных планов.
+    """
+    bot_data = {}
+    bot_data['retrieval_top_k'] = int(os.getenv("RETRIEVAL_TOP_K", DEFAULT_RETRIEVAL_TOP_K))
+    bot_data['context_token_budget'] = int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET))
+    bot_data['answer_cache'] = AnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 1024)),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600)),
+        path=os.getenv("ANSWER_CACHE_PATH"),
+    )
+    bot_data['outbound_scheduler'] = OutboundScheduler(
+        global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", GLOBAL_MESSAGES_PER_SECOND)),
+        chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", CHAT_MESSAGES_PER_SECOND)),
+    )
+    bot_data['single_flight'] = SingleFlight()
+    # История разговоров в промпте ограничена HISTORY_TOKEN_BUDGET токенов (0 отключает историю)
+    history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", HISTORY_TOKEN_BUDGET))
+    if history_token_budget > 0:
+        bot_data['conversation_store'] = ConversationStore(
+            token_budget=history_token_budget,
+            summary_budget=min(SUMMARY_TOKEN_BUDGET, history_token_budget // 2),
+            max_chats=int(os.getenv("CONVERSATION_MAX_CHATS", MAX_CHATS)),
+            max_chars=int(os.getenv("CONVERSATION_MAX_CHARS", MAX_STORED_CHARS)),
+            idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", IDLE_TTL)),
+        )
+    bot_data['metrics'] = Metrics()
+    # Запросы к LLM выполняются не больше GEMINI_MAX_CONCURRENCY одновременно, остальные ждут в очереди длиной LLM_QUEUE_SIZE;
+    # каждый пользователь может отправить к LLM в среднем USER_LLM_REQUESTS_PER_MINUTE запросов в минуту и до USER_LLM_BURST подряд.
+    # Это единственное ограничение одновременных запросов: GeminiClient только держит пул соединений того же размера
+    llm_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+    bot_data['admission'] = AdmissionController(
+        max_active=llm_concurrency,
+        max_queued=int(os.getenv("LLM_QUEUE_SIZE", MAX_QUEUED_REQUESTS)),
+        user_rate=float(os.getenv("USER_LLM_REQUESTS_PER_MINUTE", USER_REQUESTS_PER_MINUTE)) / 60,
+        user_burst=float(os.getenv("USER_LLM_BURST", USER_BURST)),
+        metrics=bot_data['metrics'],
+    )
+    bot_data['payload_log_sample_rate'] = float(os.getenv("PAYLOAD_LOG_SAMPLE_RATE", DEFAULT_PAYLOAD_LOG_SAMPLE_RATE))
+    # Команда /stats доступна пользователям из ADMIN_IDS (идентификаторы через запятую)
+    bot_data['admin_ids'] = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+    # Метрики в формате Prometheus отдаются, только если задан METRICS_PORT
+    if os.getenv("METRICS_PORT"):
+        bot_data['metrics_server'] = MetricsServer(
+            bot_data['metrics'],
+            host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            port=int(os.getenv("METRICS_PORT")),
+        )
+    # Команда /recommend по умолчанию отвечает без LLM; RECOMMEND_USE_LLM=1 включает формулировку ответа через Gemini
+    bot_data['recommend_with_llm'] = os.getenv("RECOMMEND_USE_LLM", "0") == "1"
+    bot_data['llm_streaming'] = os.getenv("GEMINI_STREAMING", "0") == "1"
+    bot_data['llm_client'] = GeminiClient(
+        gemini_api_key,
+        base_url=os.getenv("GEMINI_API_BASE", GEMINI_API_BASE),
+        timeout=float(os.getenv("GEMINI_TIMEOUT", 30)),
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3)),
+        max_concurrency=llm_concurrency,
+    )
+
+    return bot_data
+
+
+def build_application(token: str, gemini_api_key: str, updater: bool = True) -> Application:
+    """
+    Создает приложение бота: настройки и общие объекты в bot_data (см. build_bot_data) и обработчики.
+    Учебные планы в bot_data не загружаются - это делает вызывающий код.
+
+    Аргументы:
+    token (str): Токен Telegram-бота.
+    gemini_api_key (str): API ключ Gemini.
+    updater (bool): Создавать ли Updater для получения обновлений через polling.
+    """
+    # Создаем объект Application и передаем токен бота
+    # Обновления обрабатываются параллельно, чтобы ожидание ответа LLM в одном чате не задерживало другие
+    builder = Application.builder().token(token).concurrent_updates(True).post_init(on_startup).post_shutdown(on_shutdown)
+    if not updater: # В режиме webhook обновления принимает сам бот, Updater не нужен
+        builder = builder.updater(None)
+    application = builder.build()
+
+    application.bot_data.update(build_bot_data(gemini_api_key))
+
+    # Регистрируем обработчики команд
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("reset", reset_command))
+    application.add_handler(CommandHandler("recommend", recommend_command))
+
+    # Регистрируем обработчик для текстовых сообщений (кроме команд)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+
+    return application
+
+
 def main() -> None:
     """Запускает бота."""
     load_dotenv() # Загружаем переменные окружения из .env файла
@@ -223,29 +595,56 @@ def main() -> None:
         print("ОШИБКА: GEMINI_API_KEY не установлен. Бот не может быть запущен.")
         return
 
-    # Создаем объект Application и передаем токен бота
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Режим webhook: несколько рабочих процессов за одним слушающим сокетом
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        from webhook import run_webhook_workers # Нужен только в этом режиме
+        from snapshot import DEFAULT_SNAPSHOT_PATH
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if not webhook_url:
+            logger.error("Переменная окружения WEBHOOK_URL не установлена.")
+            print("ОШИБКА: для режима webhook нужен WEBHOOK_URL. Бот не может быть запущен.")
+            return
+        run_webhook_workers(
+            partial(build_application, TELEGRAM_BOT_TOKEN, GEMINI_API_KEY, updater=False),
+            webhook_url,
+            listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", 8443)),
+            workers=int(os.getenv("WEBHOOK_WORKERS", 0)) or None,
+            secret=os.getenv("WEBHOOK_SECRET"),
+            path=os.getenv("WEBHOOK_PATH", "/telegram"),
+            snapshot_path=os.getenv("CORPUS_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH),
+            reload_interval=float(os.getenv("STUDY_PLANS_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL)),
+        )
+        return
 
-    # Загружаем извлеченные тексты из PDF при запуске бота
-    print("Загрузка учебных планов...")
-    study_plan_texts = process_study_plans()
-    if not study_plan_texts:
-        logger.warning("Не удалось загрузить учебные планы. Бот будет работать без контекста PDF.")
-        print("ВНИМАНИЕ: Не удалось загрузить учебные планы. Бот не сможет отвечать на вопросы по ним.")
+    startup_report = StartupReport(STARTED_AT)
+    startup_report.mark("модули импортированы")
+    application = build_application(TELEGRAM_BOT_TOKEN, GEMINI_API_KEY)
+    application.bot_data['startup_report'] = startup_report
+    startup_report.mark("приложение создано")
+
+    if os.getenv("FAST_START", "0") == "1":
+        # Опрос Telegram начинается сразу, учебные планы загружаются в фоне (см. warm_up)
+        application.bot_data['corpus_ready'] = asyncio.Event()
+        application.bot_data['warmup_wait'] = float(os.getenv("WARMUP_WAIT", DEFAULT_WARMUP_WAIT))
+        print("Быстрый запуск: учебные планы будут загружены в фоне.")
     else:
-        print(f"Успешно загружено {len(study_plan_texts)} учебных планов.")
-    
-    # Сохраняем извлеченные тексты и API ключ в bot_data, чтобы они были доступны в обработчиках
-    application.bot_data['study_plan_texts'] = study_plan_texts
-    application.bot_data['gemini_api_key'] = GEMINI_API_KEY
-
-
-    # Регистрируем обработчики команд
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-
-    # Регистрируем обработчик для текстовых сообщений (кроме команд)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+        # Загружаем извлеченные тексты из PDF при запуске бота
+        print("Загрузка учебных планов...")
+        study_plan_texts = process_study_plans()
+        if not study_plan_texts:
+            logger.warning("Не удалось загрузить учебные планы. Бот будет работать без контекста PDF.")
+            print("ВНИМАНИЕ: Не удалось загрузить учебные планы. Бот не сможет отвечать на вопросы по ним.")
+        else:
+            print(f"Успешно загружено {len(study_plan_texts)} учебных планов.")
+
+        # Сохраняем извлеченные тексты, поисковый индекс, таблицу дисциплин и векторы для рекомендаций в bot_data, чтобы они были доступны в обработчиках
+        application.bot_data.update(build_corpus(study_plan_texts))
+        startup_report.mark("учебные планы загружены")
+    # Новые и измененные PDF-файлы подхватываются без перезапуска (STUDY_PLANS_RELOAD_INTERVAL=0 отключает проверку)
+    reload_interval = float(os.getenv("STUDY_PLANS_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+    if reload_interval > 0:
+        application.bot_data['study_plan_watcher'] = StudyPlanWatcher(application.bot_data, interval=reload_interval)
 
     # Запускаем бота (начинаем опрос обновлений от Telegram)
     print("Бот запущен. Ожидание сообщений...")
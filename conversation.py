@@ -0,0 +1,224 @@
+import re
+import time
+import logging
+from collections import OrderedDict, deque
+
+from retrieval import estimate_tokens, CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Бюджет токенов истории разговора в промпте (краткое содержание и последние вопросы с ответами)
+HISTORY_TOKEN_BUDGET = 600
+# Часть бюджета истории, которую может занимать краткое содержание старых вопросов
+SUMMARY_TOKEN_BUDGET = 150
+# Максимальная длина вопроса и ответа в строке краткого содержания
+SUMMARY_PART_CHARS = 120
+
+# Ограничения хранилища: количество чатов, общий объем текста и время бездействия чата (в секундах)
+MAX_CHATS = 10000
+MAX_STORED_CHARS = 20_000_000
+IDLE_TTL = 6 * 3600
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+SUMMARY_HEADER = "Ранее абитуриент спрашивал:\n"
+
+# Признаки уточняющего вопроса: начало с союза ("а во втором семестре?") или
+# местоимение, отсылающее к предыдущему ответу ("сколько в нем часов?")
+FOLLOW_UP_START_RE = re.compile(r"^\W*(а|и|но|тогда|также|еще|ещё|то есть|what about|and|also)\b", re.IGNORECASE)
+FOLLOW_UP_WORD_RE = re.compile(
+    r"\b(это|этот|эта|эти|этого|этой|этом|этим|этих|эту|его|её|ее|их|там|туда|тот|той|том|тех|та|те|"
+    r"он|она|оно|они|нем|нём|ней|ним|них|нему|подробнее|поподробнее|it|its|that|this|those|them)\b",
+    re.IGNORECASE,
+)
+# Вопрос из стольких слов и короче считается уточняющим ("почему?", "сколько часов?")
+FOLLOW_UP_MAX_WORDS = 2
+
+
+def _shorten(text: str, limit: int) -> str:
+    """Сокращает текст до первого предложения и не более limit символов."""
+    text = " ".join(text.split())
+    text = SENTENCE_END_RE.split(text, 1)[0]
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def is_follow_up(question: str) -> bool:
+    """
+    Проверяет, похож ли вопрос на уточнение предыдущего. Только для таких
+    вопросов в промпт добавляется история разговора: самостоятельные вопросы
+    отвечаются без нее и поэтому могут браться из кэша ответов и объединяться
+    с одинаковыми вопросами других чатов.
+    """
+    return bool(
+        FOLLOW_UP_START_RE.search(question)
+        or FOLLOW_UP_WORD_RE.search(question)
+        or len(question.split()) <= FOLLOW_UP_MAX_WORDS
+    )
+
+
+class Turn:
+    """Вопрос пользователя и ответ бота."""
+
+    __slots__ = ('question', 'answer', 'tokens')
+
+    def __init__(self, question: str, answer: str):
+        self.question = question
+        self.answer = answer
+        # Оценка учитывает подписи, с которыми вопрос и ответ попадают в промпт
+        self.tokens = estimate_tokens(f"Абитуриент: {question}\nБот: {answer}\n\n")
+
+    def __len__(self) -> int:
+        return len(self.question) + len(self.answer)
+
+
+class Conversation:
+    """
+    Состояние разговора в одном чате: последние вопросы с ответами и краткое
+    содержание более старых вопросов (по строке на вопрос).
+    """
+
+    __slots__ = ('turns', 'summary', 'summary_tokens', 'tokens', 'chars', 'updated')
+
+    def __init__(self):
+        self.turns = deque()
+        self.summary = deque()
+        self.summary_tokens = 0
+        self.tokens = 0
+        self.chars = 0
+        self.updated = time.monotonic()
+
+    def _roll_up_oldest(self) -> None:
+        """Заменяет самый старый вопрос с ответом строкой краткого содержания."""
+        turn = self.turns.popleft()
+        self.tokens -= turn.tokens
+        self.chars -= len(turn)
+        line = f"{_shorten(turn.question, SUMMARY_PART_CHARS)} — {_shorten(turn.answer, SUMMARY_PART_CHARS)}"
+        if not self.summary:
+            self.summary_tokens = estimate_tokens(SUMMARY_HEADER)
+        self.summary.append(line)
+        self.summary_tokens += estimate_tokens(f"- {line}\n")
+        self.chars += len(line)
+
+    def _trim_summary(self, budget: int) -> None:
+        """Удаляет самые старые строки краткого содержания, пока оно не уложится в бюджет."""
+        while self.summary and self.summary_tokens > budget:
+            line = self.summary.popleft()
+            self.summary_tokens -= estimate_tokens(f"- {line}\n")
+            self.chars -= len(line)
+        if not self.summary:
+            self.summary_tokens = 0
+
+    def add(self, question: str, answer: str, token_budget: int, summary_budget: int) -> None:
+        """
+        Добавляет вопрос с ответом и сжимает историю до бюджета токенов: старые
+        вопросы сворачиваются в краткое содержание, а самые старые строки
+        краткого содержания отбрасываются.
+        """
+        # Текст длиннее всего бюджета в промпт все равно не попадет
+        limit = token_budget * CHARS_PER_TOKEN
+        turn = Turn(question[:limit], answer[:limit])
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        self.chars += len(turn)
+        while self.turns and self.tokens + self.summary_tokens > token_budget:
+            self._roll_up_oldest()
+            self._trim_summary(min(summary_budget, token_budget - self.tokens))
+        self.updated = time.monotonic()
+
+    def render(self) -> str:
+        """Форматирует историю для вставки в промпт."""
+        parts = []
+        if self.summary:
+            parts.append(SUMMARY_HEADER + "\n".join(f"- {line}" for line in self.summary))
+        for turn in self.turns:
+            parts.append(f"Абитуриент: {turn.question}\nБот: {turn.answer}")
+        return "\n\n".join(parts)
+
+
+class ConversationStore:
+    """
+    Хранилище разговоров по чатам с жестким ограничением памяти: не больше
+    max_chats чатов и max_chars символов текста в сумме. При превышении
+    ограничений, а также по истечении idle_ttl секунд бездействия разговоры
+    удаляются, начиная с давно неактивных (LRU). История каждого разговора
+    сжимается до token_budget токенов независимо от его длины.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        summary_budget: int = SUMMARY_TOKEN_BUDGET,
+        max_chats: int = MAX_CHATS,
+        max_chars: int = MAX_STORED_CHARS,
+        idle_ttl: float = IDLE_TTL,
+    ):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_chats = max_chats
+        self.max_chars = max_chars
+        self.idle_ttl = idle_ttl
+        self.conversations = OrderedDict()
+        self.chars = 0
+        self.evictions = 0
+
+    def _evict(self) -> None:
+        """Удаляет разговоры, начиная с самых давно неактивных, пока соблюдаются не все ограничения."""
+        now = time.monotonic()
+        while self.conversations:
+            chat_id, conversation = next(iter(self.conversations.items()))
+            if (
+                len(self.conversations) <= self.max_chats
+                and self.chars <= self.max_chars
+                and now - conversation.updated <= self.idle_ttl
+            ):
+                break
+            del self.conversations[chat_id]
+            self.chars -= conversation.chars
+            self.evictions += 1
+
+    def history(self, chat_id: int) -> str:
+        """
+        Возвращает историю разговора для промпта (пустую строку, если ее нет).
+
+        Аргументы:
+        chat_id (int): Идентификатор чата.
+        """
+        self._evict()
+        conversation = self.conversations.get(chat_id)
+        return conversation.render() if conversation is not None else ""
+
+    def last_question(self, chat_id: int) -> str:
+        """Возвращает предыдущий вопрос в чате (пустую строку, если его нет)."""
+        conversation = self.conversations.get(chat_id)
+        if conversation is None or not conversation.turns:
+            return ""
+        return conversation.turns[-1].question
+
+    def add(self, chat_id: int, question: str, answer: str) -> None:
+        """
+        Добавляет вопрос и ответ в разговор чата.
+
+        Аргументы:
+        chat_id (int): Идентификатор чата.
+        question (str): Вопрос пользователя.
+        answer (str): Ответ бота.
+        """
+        conversation = self.conversations.get(chat_id)
+        if conversation is None:
+            conversation = self.conversations[chat_id] = Conversation()
+        else:
+            self.conversations.move_to_end(chat_id)
+        self.chars -= conversation.chars
+        conversation.add(question, answer, self.token_budget, self.summary_budget)
+        self.chars += conversation.chars
+        self._evict()
+
+    def reset(self, chat_id: int) -> None:
+        """Удаляет разговор чата."""
+        conversation = self.conversations.pop(chat_id, None)
+        if conversation is not None:
+            self.chars -= conversation.chars
+
+    def stats(self) -> dict:
+        """Возвращает количество разговоров, объем хранимого текста и число удалений."""
+        return {'chats': len(self.conversations), 'chars': self.chars, 'evictions': self.evictions}
@@ -0,0 +1,324 @@
+import re
+import logging
+from array import array
+
+from retrieval import program_title, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Короткие обозначения программ, которые используют абитуриенты, и их варианты в вопросах
+PROGRAM_ALIASES = {
+    "ai_product": ("ai_product", "ai product", "управление ии-продуктами", "ии-продукт", "ии продукт"),
+    "ai": ("ai", "искусственный интеллект", "искусственного интеллекта"),
+}
+PROGRAM_SLUGS = {
+    "Искусственный интеллект": "ai",
+    "Управление ИИ-продуктами/AI Product": "ai_product",
+}
+
+# Количество академических часов в одной зачетной единице
+HOURS_PER_CREDIT = 36
+
+# Строка дисциплины: номер семестра (или список), название, трудоемкость в з.е. и часах слитно
+COURSE_RE = re.compile(r"^(?P<semesters>\d(?:,\s*\d)*)(?P<name>\D.*?)\s+(?P<numbers>\d+)$")
+# Строка заголовка (блок, модуль, пул дисциплин) с трудоемкостью
+HEADER_RE = re.compile(r"^(?P<name>\D.*?)\s+(?P<numbers>\d+)$")
+BLOCK_RE = re.compile(r"^Блок \d+\.")
+# Числа трудоемкости, к которым PDF приклеил следующую строку
+GLUED_LINE_RE = re.compile(r"( \d+)(?=[А-ЯЁA-Z])")
+
+# Признаки вопросов привязаны к началу слова, чтобы "час" не находился в "сейчас" и "часто"
+CREDITS_QUESTION_RE = re.compile(
+    r"\b(?:кредит|зачетн|з\.\s?е\b|трудоемк|час(?:а|ов|ы)?\b|академическ\w* час|credits?\b|ects\b|hours?\b|workload\b)"
+)
+SEMESTER_QUESTION_RE = re.compile(
+    r"\b(?:(\d)|(перв|втор|трет|четв[её]рт))\w*\s+семестр|\bсеместр\w*\s+(\d)\b"
+    r"|\b(?:(\d)(?:st|nd|rd|th)?|(first|second|third|fourth))\s+semester|\bsemester\s+(\d)\b"
+)
+# Явная просьба перечислить дисциплины. Общие "что"/"какие"/"курс" сюда не входят: вопросы
+# вроде "почему во втором семестре так много курсов?" или "какие экзамены в 1 семестре?"
+# требуют рассуждения и передаются LLM.
+LISTING_QUESTION_RE = re.compile(
+    r"\b(?:какие|каких|что за)\s+(?:\w+\s+)?(?:дисциплин|предмет|курс)|\bсписок\b|\bперечисл"
+    r"|\bчто\s+(?:изучают|изучается|будет|входит|есть|проходят)"
+    r"|\b(?:what|which)\s+(?:\w+\s+)?(?:courses|subjects|disciplines)\b|\bwhat(?:'s|\s+is|\s+are)\s+(?:in|taught)\b|\blist\b"
+)
+SEMESTER_WORDS = {"перв": 1, "втор": 2, "трет": 3, "четв": 4, "firs": 1, "seco": 2, "thir": 3, "four": 4}
+
+
+def split_credits_hours(numbers: str) -> tuple[int, int] | None:
+    """
+    Разделяет слитно записанные трудоемкость в з.е. и в часах (например, "6216" - 6 з.е., 216 ч.).
+
+    Аргументы:
+    numbers (str): Строка цифр из учебного плана.
+
+    Возвращает:
+    tuple[int, int] | None: Пара (з.е., часы) или None, если разделить не удалось.
+    """
+    for split in range(1, len(numbers)):
+        credits, hours = int(numbers[:split]), int(numbers[split:])
+        if hours == credits * HOURS_PER_CREDIT:
+            return credits, hours
+    return None
+
+
+def program_slug(filename: str, text: str) -> str:
+    """
+    Возвращает короткое обозначение программы учебного плана (например, "ai").
+    Для неизвестной программы используется имя PDF-файла без расширения.
+    """
+    return PROGRAM_SLUGS.get(program_title(filename, text), filename.rsplit('.', 1)[0])
+
+
+def normalize(text: str) -> str:
+    """Приводит текст к нижнему регистру, заменяет "ё" и схлопывает пробелы."""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def detect_programs(question: str) -> set:
+    """
+    Находит в вопросе упоминания программ.
+
+    Аргументы:
+    question (str): Вопрос пользователя.
+
+    Возвращает:
+    set: Множество коротких обозначений программ (например, {"ai_product"}).
+    """
+    text = normalize(question)
+    found = set()
+    # Более длинные обозначения проверяются первыми и вырезаются из текста,
+    # чтобы "ai" не находилось внутри "ai_product"
+    for slug, aliases in PROGRAM_ALIASES.items():
+        for alias in aliases:
+            pattern = rf"(?<![\w-]){re.escape(alias)}(?![\w-])"
+            if re.search(pattern, text):
+                found.add(slug)
+                text = re.sub(pattern, " ", text)
+    return found
+
+
+# Столбцы таблицы дисциплин
+COLUMNS = ('program', 'block', 'section', 'course', 'semesters', 'credits', 'hours')
+
+
+class CourseTable:
+    """
+    Таблица дисциплин учебных планов в столбцовом виде. Строковые значения
+    хранятся в общем словаре, а столбцы - в компактных массивах индексов.
+    Семестры хранятся битовой маской (бит N-1 - семестр N).
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.program = array('H')
+        self.block = array('H')
+        self.section = array('H')
+        self.course = array('H')
+        self.semesters = array('B')
+        self.credits = array('H')
+        self.hours = array('H')
+        # Стеммированные термы названий дисциплин и индекс по первому терму для поиска в вопросах
+        self._course_terms = {}
+        self._courses_by_first_term = {}
+
+    def __len__(self) -> int:
+        return len(self.course)
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def add(self, program: str, block: str, section: str, course: str, semesters: int, credits: int, hours: int) -> None:
+        """Добавляет запись о дисциплине."""
+        course_id = self._intern(course)
+        self.program.append(self._intern(program))
+        self.block.append(self._intern(block))
+        self.section.append(self._intern(section))
+        self.course.append(course_id)
+        self.semesters.append(semesters)
+        self.credits.append(credits)
+        self.hours.append(hours)
+        self._index_course(course_id)
+
+    def _index_course(self, course_id: int) -> None:
+        if course_id not in self._course_terms:
+            terms = self._course_terms[course_id] = tuple(tokenize(self.strings[course_id]))
+            if terms:
+                self._courses_by_first_term.setdefault(terms[0], []).append(course_id)
+
+    def to_snapshot(self) -> tuple[dict, dict]:
+        """Возвращает словарь строк и столбцы таблицы для снимка."""
+        meta = {'strings': self.strings}
+        arrays = {name: getattr(self, name) for name in COLUMNS}
+        return meta, arrays
+
+    @classmethod
+    def from_snapshot(cls, meta: dict, arrays: dict) -> "CourseTable":
+        """
+        Восстанавливает таблицу из данных снимка. Столбцы используются как есть
+        (например, memoryview отображенного в память файла), а индексы строк и
+        термов названий строятся заново.
+
+        Аргументы:
+        meta (dict): Метаданные из to_snapshot.
+        arrays (dict): Столбцы из to_snapshot.
+        """
+        table = cls()
+        table.strings = meta['strings']
+        table._string_ids = {value: string_id for string_id, value in enumerate(table.strings)}
+        for name in COLUMNS:
+            setattr(table, name, arrays[name])
+        for course_id in table.course:
+            table._index_course(course_id)
+        return table
+
+    def row(self, row_id: int) -> dict:
+        """Возвращает запись в виде словаря."""
+        return {
+            'program': self.strings[self.program[row_id]],
+            'block': self.strings[self.block[row_id]],
+            'section': self.strings[self.section[row_id]],
+            'course': self.strings[self.course[row_id]],
+            'semesters': [n + 1 for n in range(8) if self.semesters[row_id] >> n & 1],
+            'credits': self.credits[row_id],
+            'hours': self.hours[row_id],
+        }
+
+    @classmethod
+    def from_texts(cls, texts: dict) -> "CourseTable":
+        """
+        Разбирает тексты учебных планов в таблицу дисциплин.
+
+        Аргументы:
+        texts (dict): Словарь {имя PDF-файла: извлеченный текст}.
+
+        Возвращает:
+        CourseTable: Заполненная таблица.
+        """
+        table = cls()
+        for filename, text in texts.items():
+            program = program_slug(filename, text)
+            block = section = ""
+            for line in GLUED_LINE_RE.sub("\\1\n", text).splitlines():
+                line = line.strip()
+                course_match = COURSE_RE.match(line)
+                if course_match:
+                    effort = split_credits_hours(course_match['numbers'])
+                    if effort is None:
+                        continue
+                    semesters = 0
+                    for semester in re.findall(r"\d", course_match['semesters']):
+                        semesters |= 1 << (int(semester) - 1)
+                    table.add(program, block, section, course_match['name'].strip(), semesters, *effort)
+                    continue
+                header_match = HEADER_RE.match(line)
+                if header_match:
+                    if BLOCK_RE.match(line):
+                        block = section = header_match['name']
+                    else:
+                        section = header_match['name']
+        logger.info(f"Разобрано {len(table)} записей о дисциплинах.")
+        return table
+
+    def find_courses(self, question: str) -> list:
+        """
+        Находит дисциплины, название которых упомянуто в вопросе. Названия
+        сравниваются по стеммированным термам, поэтому падеж не важен.
+        Если термы одного найденного названия идут подряд в более длинном
+        найденном названии, остается только более длинное.
+
+        Аргументы:
+        question (str): Вопрос пользователя.
+
+        Возвращает:
+        list: Идентификаторы названий дисциплин в общем словаре строк.
+        """
+        question_terms = tokenize(question)
+        matches = set()
+        for i, term in enumerate(question_terms):
+            for course_id in self._courses_by_first_term.get(term, ()):
+                terms = self._course_terms[course_id]
+                if tuple(question_terms[i:i + len(terms)]) == terms:
+                    matches.add(course_id)
+        return [
+            course_id for course_id in matches
+            if not any(other != course_id and self._contains_terms(other, course_id) for other in matches)
+        ]
+
+    def _contains_terms(self, course_id: int, other_id: int) -> bool:
+        """Проверяет, идут ли термы названия other_id подряд в более длинном названии course_id."""
+        terms, other_terms = self._course_terms[course_id], self._course_terms[other_id]
+        return len(terms) > len(other_terms) and any(
+            terms[i:i + len(other_terms)] == other_terms for i in range(len(terms) - len(other_terms) + 1)
+        )
+
+    def rows_where(self, course_ids=None, programs=None, semester=None) -> list:
+        """Возвращает номера строк, удовлетворяющих условиям."""
+        program_ids = None if not programs else {self._string_ids[p] for p in programs if p in self._string_ids}
+        mask = 1 << (semester - 1) if semester else 0
+        return [
+            row_id for row_id in range(len(self))
+            if (course_ids is None or self.course[row_id] in course_ids)
+            and (program_ids is None or self.program[row_id] in program_ids)
+            and (not mask or self.semesters[row_id] & mask)
+        ]
+
+    def answer(self, question: str) -> str | None:
+        """
+        Пытается ответить на фактический вопрос по таблице без обращения к LLM:
+        трудоемкость конкретной дисциплины или список дисциплин семестра.
+
+        Аргументы:
+        question (str): Вопрос пользователя.
+
+        Возвращает:
+        str | None: Готовый ответ или None, если вопрос нужно передать LLM.
+        """
+        text = normalize(question)
+        programs = detect_programs(question)
+
+        if CREDITS_QUESTION_RE.search(text):
+            course_ids = set(self.find_courses(question))
+            if course_ids:
+                rows = self.rows_where(course_ids, programs)
+                if rows:
+                    return self._format_effort(rows)
+
+        # Список дисциплин возвращается только на явную просьбу перечислить их в конкретном семестре
+        semester_match = SEMESTER_QUESTION_RE.search(text)
+        if semester_match and LISTING_QUESTION_RE.search(text):
+            value = next(group for group in semester_match.groups() if group)
+            semester = int(value) if value.isdigit() else SEMESTER_WORDS[value[:4]]
+            rows = self.rows_where(programs=programs, semester=semester)
+            if rows:
+                return self._format_semester(rows, semester)
+        return None
+
+    def _format_effort(self, rows: list) -> str:
+        lines = []
+        for row_id in rows:
+            row = self.row(row_id)
+            semesters = ", ".join(map(str, row['semesters']))
+            lines.append(
+                f"«{row['course']}» ({row['program']}, семестр {semesters}, {row['section']}): "
+                f"{row['credits']} з.е., {row['hours']} ч."
+            )
+        return "\n".join(lines)
+
+    def _format_semester(self, rows: list, semester: int) -> str:
+        parts = []
+        current = None
+        for row_id in rows:
+            row = self.row(row_id)
+            heading = (row['program'], row['section'])
+            if heading != current:
+                current = heading
+                parts.append(f"\n{row['program']} - {row['section']}:")
+            parts.append(f"• {row['course']} ({row['credits']} з.е.)")
+        return f"Дисциплины {semester} семестра:" + "\n".join(parts)
@@ -0,0 +1,214 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram: около 30 сообщений в секунду для всех чатов бота
+# и около одного сообщения в секунду в одном чате (с небольшим запасом на всплески)
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+CHAT_BURST = 3
+
+# Сколько ограничителей отдельных чатов хранить одновременно
+MAX_TRACKED_CHATS = 10000
+
+
+def find_split_point(text: str, limit: int, start: int = 0) -> int:
+    """
+    Находит место разрыва текста не дальше limit символов от start: по границе
+    абзаца, строки, предложения или слова, а если их нет - ровно через limit
+    символов. Границы абзацев и строк используются, только если первая часть
+    получается не короче половины limit.
+
+    Аргументы:
+    text (str): Текст.
+    limit (int): Максимальная длина первой части.
+    start (int): Позиция начала первой части.
+
+    Возвращает:
+    int: Позиция разрыва в тексте.
+    """
+    end = start + limit
+    for separator, min_position in (('\n\n', start + limit // 2), ('\n', start + limit // 2), ('. ', start), (' ', start)):
+        position = text.rfind(separator, start, end)
+        if position > min_position:
+            # Точку оставляем в конце первой части
+            return position + 1 if separator == '. ' else position
+    return end
+
+
+def split_message(text: str, limit: int) -> list:
+    """
+    Разбивает текст на части не длиннее limit символов за один проход,
+    стараясь разрывать по абзацам, строкам и предложениям.
+
+    Аргументы:
+    text (str): Текст сообщения.
+    limit (int): Максимальная длина одной части.
+
+    Возвращает:
+    list: Список частей.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while length - start > limit:
+        split = find_split_point(text, limit, start)
+        chunk = text[start:split].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = split
+        while start < length and text[start].isspace():
+            start += 1
+    chunk = text[start:].strip()
+    if chunk or not chunks:
+        chunks.append(chunk)
+    return chunks
+
+
+class TokenBucket:
+    """Ограничитель частоты по алгоритму token bucket."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Возвращает, сколько секунд нужно подождать до появления токена (0 - токен есть)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Ожидает появления токена и забирает его, не блокируя цикл событий."""
+        while (wait := self.delay()) > 0:
+            await asyncio.sleep(wait)
+        self.tokens -= 1
+
+
+class OutboundScheduler:
+    """
+    Планировщик исходящих сообщений. Сообщения каждого чата отправляются по
+    очереди в порядке поступления отдельной задачей, а разные чаты обслуживаются
+    параллельно. Частота отправки ограничивается общим ограничителем бота и
+    ограничителем каждого чата; при ответе Telegram RetryAfter отправка
+    повторяется после указанной паузы.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_MESSAGES_PER_SECOND,
+        chat_rate: float = CHAT_MESSAGES_PER_SECOND,
+        chat_burst: float = CHAT_BURST,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = OrderedDict()
+        self.queues = {}
+        self.workers = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            while len(self.chat_buckets) > MAX_TRACKED_CHATS:
+                self.chat_buckets.popitem(last=False)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def submit(self, chat_id: int, send) -> asyncio.Future:
+        """
+        Ставит отправку в очередь чата.
+
+        Аргументы:
+        chat_id (int): Идентификатор чата.
+        send: Функция без аргументов, возвращающая корутину отправки.
+
+        Возвращает:
+        asyncio.Future: Результат отправки (например, объект Message).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(chat_id, deque()).append((send, future))
+        if chat_id not in self.workers:
+            self.workers[chat_id] = asyncio.create_task(self._worker(chat_id))
+        return future
+
+    async def _worker(self, chat_id: int) -> None:
+        queue = self.queues[chat_id]
+        try:
+            while queue:
+                send, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                try:
+                    await self._chat_bucket(chat_id).acquire()
+                    await self.global_bucket.acquire()
+                    result = await self._send_with_retry(send)
+                except asyncio.CancelledError:
+                    future.cancel() # Отправка, начатая до отмены задачи, тоже отменяется
+                    raise
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+        finally:
+            del self.workers[chat_id]
+            del self.queues[chat_id]
+            # Задача была отменена (например, при остановке бота) - отменяем оставшиеся отправки
+            for _, future in queue:
+                future.cancel()
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Останавливает отправку при остановке бота: дает очередям чатов
+        отправиться не дольше timeout секунд, затем отменяет оставшиеся
+        задачи и дожидается их завершения.
+        """
+        workers = list(self.workers.values())
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _send_with_retry(self, send, attempts: int = 3):
+        for attempt in range(attempts):
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt == attempts - 1:
+                    raise
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+                logger.warning(f"Превышен лимит Telegram, повтор отправки через {seconds} с.")
+                await asyncio.sleep(seconds)
+
+    async def send_chunks(self, chat_id: int, send_text, chunks: list) -> list:
+        """
+        Отправляет части сообщения в чат по порядку.
+
+        Аргументы:
+        chat_id (int): Идентификатор чата.
+        send_text: Корутинная функция, отправляющая текст (например, message.reply_text).
+        chunks (list): Части сообщения.
+
+        Возвращает:
+        list: Результаты отправки частей.
+        """
+        futures = [self.submit(chat_id, lambda chunk=chunk: send_text(chunk)) for chunk in chunks]
+        return await asyncio.gather(*futures)
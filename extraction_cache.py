@@ -0,0 +1,155 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Версия алгоритма извлечения текста. При изменении логики извлечения её нужно
+# увеличить, чтобы все ранее сохраненные записи кэша стали недействительными.
+EXTRACTOR_VERSION = 2
+
+# Имя файла-кэша, который хранится рядом с PDF-файлами
+CACHE_FILENAME = ".extraction_cache.json.gz"
+
+
+def file_sha256(path: str) -> str:
+    """
+    Вычисляет SHA-256 содержимого файла, читая его блоками.
+
+    Аргументы:
+    path (str): Путь к файлу.
+
+    Возвращает:
+    str: Шестнадцатеричный хэш содержимого файла.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Постоянный кэш извлеченного текста PDF-файлов.
+
+    Записи хранятся в сжатом JSON-файле в той же директории, что и PDF-файлы.
+    Ключом служит хэш содержимого файла и версия извлекателя, поэтому неизмененные
+    файлы повторно не обрабатываются. Чтобы не хэшировать файл при каждом запуске,
+    дополнительно запоминаются размер и время изменения: если они совпадают,
+    хэш считается прежним.
+    """
+
+    def __init__(self, pdf_dir: str, version: int = EXTRACTOR_VERSION):
+        self.path = os.path.join(pdf_dir, CACHE_FILENAME)
+        self.version = version
+        self.entries = {}
+        self.dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        """Загружает записи кэша с диска, игнорируя поврежденный или устаревший файл."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш извлечения {self.path}: {e}. Кэш будет пересоздан.")
+            self.dirty = True
+            return
+        if data.get('version') != self.version:
+            logger.info(f"Версия кэша извлечения изменилась, кэш {self.path} будет пересоздан.")
+            self.dirty = True
+            return
+        self.entries = data.get('entries', {})
+
+    def fingerprint(self, filename: str, pdf_path: str) -> tuple[str, int, int]:
+        """
+        Возвращает отпечаток PDF-файла: хэш содержимого, размер и время изменения.
+        Если размер и mtime совпадают с сохраненными, хэш берется из записи кэша.
+        Отпечаток нужно получать до извлечения текста: если файл заменят во время
+        извлечения, запись останется привязанной к прежнему содержимому, и при
+        следующей загрузке файл будет обработан заново.
+
+        Аргументы:
+        filename (str): Имя PDF-файла (ключ записи).
+        pdf_path (str): Полный путь к PDF-файлу.
+
+        Возвращает:
+        tuple[str, int, int]: SHA-256, размер в байтах и время изменения в наносекундах.
+        """
+        stat = os.stat(pdf_path)
+        entry = self.entries.get(filename)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['sha256'], stat.st_size, stat.st_mtime_ns
+        return file_sha256(pdf_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, filename: str, fingerprint: tuple[str, int, int]) -> str | None:
+        """
+        Возвращает текст из кэша, если файл не изменился с момента последнего извлечения.
+
+        Аргументы:
+        filename (str): Имя PDF-файла (ключ записи).
+        fingerprint (tuple[str, int, int]): Отпечаток файла (результат fingerprint).
+
+        Возвращает:
+        str | None: Сохраненный текст или None, если записи нет или она устарела.
+        """
+        entry = self.entries.get(filename)
+        sha256, size, mtime_ns = fingerprint
+        if entry is None or sha256 != entry['sha256']:
+            return None
+        if entry.get('mtime_ns') != mtime_ns:
+            # Содержимое прежнее (например, файл скачан заново), обновляем метаданные
+            entry['size'] = size
+            entry['mtime_ns'] = mtime_ns
+            self.dirty = True
+        return entry['text']
+
+    def put(self, filename: str, fingerprint: tuple[str, int, int], text: str) -> None:
+        """
+        Сохраняет извлеченный текст в кэш.
+
+        Аргументы:
+        filename (str): Имя PDF-файла (ключ записи).
+        fingerprint (tuple[str, int, int]): Отпечаток файла, полученный до извлечения текста.
+        text (str): Извлеченный текст.
+        """
+        sha256, size, mtime_ns = fingerprint
+        self.entries[filename] = {
+            'sha256': sha256,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'text': text,
+        }
+        self.dirty = True
+
+    def evict_missing(self, present_filenames) -> None:
+        """
+        Удаляет записи для PDF-файлов, которых больше нет в директории.
+
+        Аргументы:
+        present_filenames: Имена PDF-файлов, присутствующих в директории.
+        """
+        stale = set(self.entries) - set(present_filenames)
+        for filename in stale:
+            del self.entries[filename]
+            logger.info(f"Удалена устаревшая запись кэша извлечения: {filename}")
+        if stale:
+            self.dirty = True
+
+    def save(self) -> None:
+        """Атомарно записывает кэш на диск, если в нем были изменения."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as file:
+                json.dump({'version': self.version, 'entries': self.entries}, file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш извлечения {self.path}: {e}")
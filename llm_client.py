@@ -0,0 +1,169 @@
+import json
+import random
+import asyncio
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Коды ответов, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiClient:
+    """
+    Асинхронный клиент Gemini API. Использует один пул keep-alive соединений,
+    повторяет запросы с экспоненциальной задержкой со случайным разбросом при
+    ответах 429 и 5xx. Размер пула соединений задает max_concurrency; число
+    одновременных запросов к модели ограничивает допуск (см. admission.py),
+    поэтому клиент сам запросы не задерживает.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = GEMINI_MODEL,
+        base_url: str = GEMINI_API_BASE,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_concurrency: int = 8,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self._client = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            headers={'Content-Type': 'application/json', 'x-goog-api-key': self.api_key},
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP-клиент создается при первом обращении, уже внутри цикла событий."""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    async def open(self) -> None:
+        """
+        Создает HTTP-клиент заранее в пуле потоков. Создание клиента загружает
+        сертификаты для TLS и занимает сотни миллисекунд, которые иначе
+        блокировали бы цикл событий при первом запросе.
+        """
+        if self._client is not None:
+            return
+        client = await asyncio.to_thread(self._create_client)
+        if self._client is None:
+            self._client = client
+        else: # Клиент успели создать при обработке запроса
+            await client.aclose()
+
+    def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+        """Вычисляет задержку перед повтором с учетом заголовка Retry-After."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def post(self, path: str, payload: dict) -> httpx.Response:
+        """
+        Отправляет POST-запрос к API с повторами при временных ошибках.
+
+        Аргументы:
+        path (str): Путь относительно базового URL API.
+        payload (dict): Тело запроса.
+
+        Возвращает:
+        httpx.Response: Успешный ответ API.
+
+        Исключения:
+        httpx.HTTPError: Если запрос не удался после всех повторов.
+        """
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.client.post(path, json=payload)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                logger.warning(f"Gemini API вернул {response.status_code}, повтор {attempt + 1}/{self.max_retries}")
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Ошибка соединения с Gemini API: {e!r}, повтор {attempt + 1}/{self.max_retries}")
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def generate_content(self, payload: dict) -> dict:
+        """
+        Вызывает метод generateContent модели.
+
+        Аргументы:
+        payload (dict): Тело запроса generateContent.
+
+        Возвращает:
+        dict: Разобранный JSON-ответ API.
+        """
+        response = await self.post(f"/models/{self.model}:generateContent", payload)
+        return response.json()
+
+    async def stream_generate_content(self, payload: dict):
+        """
+        Вызывает метод streamGenerateContent модели и возвращает текст ответа
+        по мере генерации. Повторы при временных ошибках выполняются только до
+        получения первого фрагмента ответа.
+
+        Аргументы:
+        payload (dict): Тело запроса generateContent.
+
+        Возвращает:
+        Асинхронный генератор строк - очередные фрагменты текста ответа.
+        """
+        path = f"/models/{self.model}:streamGenerateContent"
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self.client.stream("POST", path, params={'alt': 'sse'}, json=payload) as response:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        if response.is_error:
+                            await response.aread()
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith('data:'):
+                                continue
+                            for candidate in json.loads(line[5:]).get('candidates', []):
+                                for part in candidate.get('content', {}).get('parts', []):
+                                    if part.get('text'):
+                                        yield part['text']
+                        return
+                logger.warning(f"Gemini API вернул {response.status_code}, повтор {attempt + 1}/{self.max_retries}")
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == self.max_retries or response is not None:
+                    raise
+                logger.warning(f"Ошибка соединения с Gemini API: {e!r}, повтор {attempt + 1}/{self.max_retries}")
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def aclose(self) -> None:
+        """Закрывает пул соединений."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
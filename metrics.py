@@ -0,0 +1,228 @@
+import time
+import asyncio
+import hashlib
+import logging
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию (в секундах)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Границы корзин для размеров (символы, токены)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+# Количество последних наблюдений, по которым вычисляются процентили
+RESERVOIR_SIZE = 2048
+
+# Процентили, которые выводятся командой /stats
+PERCENTILES = (50, 95, 99)
+
+# Описания метрик бота для вывода в формате Prometheus
+METRIC_HELP = {
+    'bot_stage_seconds': ('histogram', "Длительность этапов обработки сообщения"),
+    'bot_prompt_chars': ('histogram', "Размер промпта в символах"),
+    'bot_prompt_tokens': ('histogram', "Оценка размера промпта в токенах"),
+    'bot_answers_total': ('counter', "Ответы по источнику"),
+    'bot_errors_total': ('counter', "Ошибки обработки сообщений по типу"),
+    'bot_startup_seconds': ('gauge', "Моменты этапов запуска бота от начала импорта модулей"),
+    'bot_admission_queue_depth': ('gauge', "Количество запросов к LLM, ожидающих в очереди допуска"),
+    'bot_admission_wait_seconds': ('histogram', "Время ожидания допуска запроса к LLM"),
+    'bot_admission_rejected_total': ('counter', "Отклоненные запросы к LLM по причине"),
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """
+    Гистограмма наблюдений: накопительные корзины для вывода в формате
+    Prometheus и последние RESERVOIR_SIZE значений для вычисления процентилей.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'recent')
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, p: float) -> float:
+        """Возвращает p-й процентиль последних наблюдений (0, если наблюдений нет)."""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Metrics:
+    """
+    Реестр метрик бота: счетчики, значения (gauge) и гистограммы с метками.
+    Все методы синхронные и вызываются из цикла событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Увеличивает счетчик."""
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Устанавливает текущее значение метрики."""
+        self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+        """Добавляет наблюдение в гистограмму."""
+        series = self.histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Измеряет длительность блока кода и добавляет ее в гистограмму."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render_prometheus(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        lines = []
+        for kind, registry in (('counter', self.counters), ('gauge', self.gauges)):
+            for name, series in sorted(registry.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, ('histogram', name))[1]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Возвращает краткую сводку метрик для команды /stats."""
+        lines = [f"Время работы: {int(time.time() - self.started)} с."]
+        for name, series in sorted(self.histograms.items()):
+            for key, histogram in sorted(series.items()):
+                percentiles = ", ".join(f"p{p}={histogram.percentile(p):.3g}" for p in PERCENTILES)
+                lines.append(f"{name}{_format_labels(key)}: n={histogram.count}, {percentiles}")
+        for registry in (self.counters, self.gauges):
+            for name, series in sorted(registry.items()):
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)}: {value:g}")
+        return "\n".join(lines)
+
+
+class StartupReport:
+    """
+    Отчет о времени запуска бота: моменты наступления этапов запуска
+    (в секундах от начала импорта модулей).
+    """
+
+    def __init__(self, started: float | None = None):
+        self.started = time.perf_counter() if started is None else started
+        self.milestones = []
+
+    def mark(self, milestone: str) -> float:
+        """Отмечает наступление этапа и возвращает время от начала запуска."""
+        elapsed = time.perf_counter() - self.started
+        self.milestones.append((milestone, elapsed))
+        return elapsed
+
+    def render(self) -> str:
+        """Возвращает отчет одной строкой."""
+        return ", ".join(f"{milestone}: {elapsed:.2f} с." for milestone, elapsed in self.milestones)
+
+    def export(self, metrics: Metrics) -> None:
+        """Сохраняет моменты этапов запуска в метриках."""
+        for milestone, elapsed in self.milestones:
+            metrics.set_gauge('bot_startup_seconds', round(elapsed, 3), milestone=milestone)
+
+
+def payload_digest(text: str) -> str:
+    """Возвращает короткий отпечаток текста для логов вместо самого текста."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class MetricsServer:
+    """
+    Минимальный HTTP-сервер, отдающий метрики в формате Prometheus по пути /metrics.
+    Работает в том же цикле событий, что и бот.
+    """
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self) -> None:
+        """Начинает принимать соединения."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Метрики доступны по адресу http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        """Закрывает сервер."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их нужно дочитать до пустой строки
+            while await asyncio.wait_for(reader.readline(), timeout=5) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = "200 OK", self.metrics.render_prometheus().encode('utf-8')
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.warning(f"Ошибка при обработке запроса метрик: {e!r}")
+        finally:
+            writer.close()
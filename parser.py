@@ -1,26 +1,48 @@
 import requests
 from bs4 import BeautifulSoup
 import os
-import time
+import re
+import json
+import queue
+import threading
+import argparse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+except ImportError: # Selenium нужен только как запасной путь, если ссылку не удалось найти без браузера
+    webdriver = None
 
-def download_study_plan(url, output_dir="study_plans"):
+# URL-ы магистерских программ по умолчанию
+DEFAULT_PROGRAM_URLS = [
+    "https://abit.itmo.ru/program/master/ai",
+    "https://abit.itmo.ru/program/master/ai_product"
+]
+
+# Страница со списком всех магистерских программ
+PROGRAMS_LIST_URL = "https://abit.itmo.ru/programs/master"
+PROGRAM_URL_RE = re.compile(r"/program/master/[\w-]+")
+PDF_URL_RE = re.compile(r"\.pdf(?:$|\?)", re.IGNORECASE)
+
+# Файл со сведениями о скачанных PDF-файлах (ETag, Last-Modified)
+MANIFEST_FILENAME = ".download_manifest.json"
+
+def create_driver(output_dir="study_plans"):
     """
-    Скачивает учебный план в формате PDF с указанного URL, используя Selenium для имитации клика по кнопке.
+    Создает headless-экземпляр Chrome, настроенный на скачивание PDF в output_dir.
 
     Аргументы:
-    url (str): URL страницы, с которой нужно скачать учебный план.
     output_dir (str): Директория для сохранения PDF-файлов.
     """
-    print(f"Попытка загрузки учебного плана с: {url} с использованием Selenium.")
-
     # Настройка опций Chrome
     options = Options()
     options.add_argument("--headless")  # Запуск браузера в фоновом режиме (без графического интерфейса)
@@ -32,129 +54,430 @@ def download_study_plan(url, output_dir="study_plans"):
         "download.directory_upgrade": True,
         "plugins.always_open_pdf_externally": True # Открывать PDF во внешнем приложении, а не в браузере
     })
+    return webdriver.Chrome(options=options) # Если chromedriver в PATH
 
-    driver = None
-    try:
-        # Инициализация WebDriver
-        driver = webdriver.Chrome(options=options) # Если chromedriver в PATH
+class DriverPool:
+    """
+    Ограниченный пул экземпляров WebDriver. Браузеры создаются по мере
+    необходимости (не более size) и переиспользуются между страницами.
+    """
 
-        driver.get(url)
-        print(f"Страница загружена: {url}")
+    def __init__(self, size, output_dir="study_plans"):
+        self.size = size
+        self.output_dir = output_dir
+        self.idle = queue.Queue()
+        self.created = []
+        self.creating = 0
+        self.lock = threading.Lock()
 
-        # Попытка закрыть возможный баннер с согласием на использование файлов cookie
+    @contextmanager
+    def driver(self):
+        """Выдает свободный браузер на время работы с одной страницей."""
         try:
-            # Ищем кнопку "Принять" или "Согласен" для cookie-баннера
-            cookie_accept_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Принять') or contains(., 'Согласен')]"))
-            )
-            cookie_accept_button.click()
-            print("Нажатa кнопка согласия на использование файлов cookie (если была).")
-            time.sleep(1) # Даем время баннеру исчезнуть
-        except TimeoutException:
-            print("Баннер с согласием на использование файлов cookie не найден или не стал кликабельным.")
-        except Exception as e:
-            print(f"Ошибка при попытке закрыть cookie-баннер: {e}")
-
-        # Ждем, пока кнопка "СКАЧАТЬ УЧЕБНЫЙ ПЛАН" станет кликабельной
+            driver = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = len(self.created) + self.creating < self.size
+                if can_create:
+                    self.creating += 1
+            if can_create:
+                try:
+                    driver = create_driver(self.output_dir)
+                    driver.cookies_accepted = False
+                    with self.lock:
+                        self.created.append(driver)
+                finally:
+                    with self.lock:
+                        self.creating -= 1
+            else:
+                driver = self.idle.get()
         try:
-            download_button = WebDriverWait(driver, 20).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Скачать учебный план')]"))
-            )
-            print("Кнопка 'Скачать учебный план' найдена и кликабельна.")
-            
-            # Прокручиваем элемент в видимую область
-            driver.execute_script("arguments[0].scrollIntoView(true);", download_button)
-            time.sleep(1) # Даем время на прокрутку
+            yield driver
+        finally:
+            self.idle.put(driver)
 
-            # Попытка клика
+    def close(self):
+        """Закрывает все браузеры пула."""
+        for driver in self.created:
             try:
-                download_button.click()
-                print("Кнопка нажата стандартным способом.")
-            except ElementClickInterceptedException:
-                print("Стандартный клик перехвачен. Попытка клика через JavaScript.")
-                driver.execute_script("arguments[0].click();", download_button)
-                print("Кнопка нажата через JavaScript.")
-
-            print("Ожидание загрузки PDF или открытия новой вкладки.")
-            time.sleep(3) 
-
-            # Проверяем, открылась ли новая вкладка/окно с PDF
-            pdf_link = None
-            original_window = driver.current_window_handle
-            for window_handle in driver.window_handles:
-                if window_handle != original_window:
-                    driver.switch_to.window(window_handle)
-                    current_url = driver.current_url
-                    if current_url.lower().endswith('.pdf') and "exams" not in current_url.lower():
-                        pdf_link = current_url
-                        print(f"PDF-файл открылся в новой вкладке: {pdf_link}")
-                        driver.close() # Закрываем новую вкладку
-                        driver.switch_to.window(original_window) # Возвращаемся к исходной вкладке
-                        break
-            
-            # Если PDF не открылся в новой вкладке, возможно, он скачался напрямую
-            # В этом случае Selenium не может напрямую получить URL загруженного файла.
-            # Мы можем попытаться найти ссылку на PDF в HTML после клика, если она появилась динамически.
-            if not pdf_link:
-                # Повторно парсим страницу после клика, чтобы найти потенциально динамически появившуюся ссылку
-                updated_soup = BeautifulSoup(driver.page_source, 'html.parser')
-                for a_tag in updated_soup.find_all('a', href=True):
-                    potential_pdf_link = urljoin(url, a_tag['href'])
-                    if potential_pdf_link.lower().endswith('.pdf') and "exams" not in potential_pdf_link.lower():
-                        pdf_link = potential_pdf_link
-                        print(f"Найдена PDF ссылка на обновленной странице: {pdf_link}")
-                        break
-
-            if pdf_link:
-                # Создаем директорию, если ее нет
-                os.makedirs(output_dir, exist_ok=True)
-
-                # Определяем имя файла из URL, удаляя параметры запроса
-                file_name = pdf_link.split('/')[-1]
-                if '?' in file_name:
-                    file_name = file_name.split('?')[0]
-                
-                file_path = os.path.join(output_dir, file_name)
-
-                # Скачиваем PDF-файл с помощью requests (более надежно для больших файлов)
-                pdf_response = requests.get(pdf_link, stream=True)
-                pdf_response.raise_for_status()
-
-                with open(file_path, 'wb') as f:
-                    for chunk in pdf_response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Учебный план успешно скачан и сохранен как: {file_path}")
-                return file_path
-            else:
-                print(f"PDF ссылка на учебный план не найдена после клика по кнопке на странице: {url}")
-                return None
+                driver.quit()
+            except Exception as e:
+                print(f"Ошибка при закрытии браузера: {e}")
+        self.created.clear()
+
+def create_session(pool_size=8):
+    """
+    Создает HTTP-сессию с пулом keep-alive соединений и повторами при временных ошибках.
+
+    Аргументы:
+    pool_size (int): Максимальное число соединений с одним хостом.
+    """
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-        except TimeoutException:
-            print(f"Таймаут: Кнопка 'Скачать учебный план' не найдена или не стала кликабельной на странице: {url}")
-            return None
-        except NoSuchElementException:
-            print(f"Элемент не найден: Кнопка 'Скачать учебный план' не найдена на странице: {url}")
-            return None
+def find_pdf_link_in_page(page_source, url):
+    """Ищет ссылку на PDF учебного плана (не на экзаменационные вопросы) в HTML страницы."""
+    soup = BeautifulSoup(page_source, 'html.parser')
+    for a_tag in soup.find_all('a', href=True):
+        potential_pdf_link = urljoin(url, a_tag['href'])
+        if potential_pdf_link.lower().endswith('.pdf') and "exams" not in potential_pdf_link.lower():
+            return potential_pdf_link
+    return None
 
+def accept_cookies(driver):
+    """Закрывает баннер с согласием на использование файлов cookie, если он появился."""
+    try:
+        # Ищем кнопку "Принять" или "Согласен" для cookie-баннера
+        cookie_accept_button = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Принять') or contains(., 'Согласен')]"))
+        )
+        cookie_accept_button.click()
+        # Ждем, пока баннер исчезнет, вместо фиксированной паузы
+        WebDriverWait(driver, 5).until(EC.invisibility_of_element(cookie_accept_button))
+        print("Нажатa кнопка согласия на использование файлов cookie (если была).")
+    except TimeoutException:
+        print("Баннер с согласием на использование файлов cookie не найден или не стал кликабельным.")
+    except Exception as e:
+        print(f"Ошибка при попытке закрыть cookie-баннер: {e}")
+    driver.cookies_accepted = True
+
+def find_study_plan_link(driver, url):
+    """
+    Открывает страницу программы, нажимает кнопку "Скачать учебный план" и
+    возвращает ссылку на PDF-файл.
+
+    Аргументы:
+    driver: Экземпляр WebDriver.
+    url (str): URL страницы программы.
+    """
+    driver.get(url)
+    print(f"Страница загружена: {url}")
+
+    # Попытка закрыть возможный баннер с согласием на использование файлов cookie
+    if not getattr(driver, 'cookies_accepted', False):
+        accept_cookies(driver)
+
+    # Ждем, пока кнопка "СКАЧАТЬ УЧЕБНЫЙ ПЛАН" станет кликабельной
+    download_button_locator = (By.XPATH, "//button[contains(., 'Скачать учебный план')]")
+    download_button = WebDriverWait(driver, 20).until(EC.element_to_be_clickable(download_button_locator))
+    print("Кнопка 'Скачать учебный план' найдена и кликабельна.")
+
+    # Прокручиваем элемент в видимую область и ждем, пока он снова станет кликабельным
+    driver.execute_script("arguments[0].scrollIntoView(true);", download_button)
+    download_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable(download_button_locator))
+
+    original_window = driver.current_window_handle
+    # Попытка клика
+    try:
+        download_button.click()
+        print("Кнопка нажата стандартным способом.")
+    except ElementClickInterceptedException:
+        print("Стандартный клик перехвачен. Попытка клика через JavaScript.")
+        driver.execute_script("arguments[0].click();", download_button)
+        print("Кнопка нажата через JavaScript.")
+
+    # Ждем открытия новой вкладки или появления ссылки на PDF на странице
+    print("Ожидание загрузки PDF или открытия новой вкладки.")
+    try:
+        WebDriverWait(driver, 10).until(
+            lambda d: len(d.window_handles) > 1 or find_pdf_link_in_page(d.page_source, url)
+        )
+    except TimeoutException:
+        return None
+
+    # Проверяем, открылась ли новая вкладка/окно с PDF
+    pdf_link = None
+    for window_handle in driver.window_handles:
+        if window_handle != original_window:
+            driver.switch_to.window(window_handle)
+            try:
+                WebDriverWait(driver, 10).until(lambda d: d.current_url not in ("", "about:blank"))
+            except TimeoutException:
+                pass
+            current_url = driver.current_url
+            if not pdf_link and current_url.lower().endswith('.pdf') and "exams" not in current_url.lower():
+                pdf_link = current_url
+                print(f"PDF-файл открылся в новой вкладке: {pdf_link}")
+            driver.close() # Закрываем новую вкладку, чтобы переиспользовать браузер
+    driver.switch_to.window(original_window) # Возвращаемся к исходной вкладке
+
+    # Если PDF не открылся в новой вкладке, возможно, он скачался напрямую.
+    # Ищем ссылку на PDF в HTML после клика, если она появилась динамически.
+    if not pdf_link:
+        pdf_link = find_pdf_link_in_page(driver.page_source, url)
+        if pdf_link:
+            print(f"Найдена PDF ссылка на обновленной странице: {pdf_link}")
+    return pdf_link
+
+class DownloadManifest:
+    """
+    Сведения о ранее скачанных PDF-файлах (ETag и Last-Modified для каждой ссылки),
+    позволяющие при обновлении отправлять условные запросы и не скачивать
+    неизмененные учебные планы повторно. Хранится в файле рядом с PDF-файлами.
+    """
+
+    def __init__(self, output_dir="study_plans"):
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Не удалось прочитать {self.path}: {e}. Все учебные планы будут скачаны заново.")
+
+    def get(self, pdf_link):
+        with self.lock:
+            return self.entries.get(pdf_link)
+
+    def put(self, pdf_link, file_name, response):
+        with self.lock:
+            self.entries[pdf_link] = {
+                'file': file_name,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+def download_pdf(pdf_link, output_dir="study_plans", session=None, manifest=None):
+    """
+    Скачивает PDF-файл по ссылке потоково. Если передан манифест и файл уже
+    скачивался, отправляется условный запрос, и неизмененный файл не скачивается.
+
+    Аргументы:
+    pdf_link (str): Ссылка на PDF-файл.
+    output_dir (str): Директория для сохранения.
+    session (requests.Session): HTTP-сессия с пулом соединений (по умолчанию - без сессии).
+    manifest (DownloadManifest): Сведения о ранее скачанных файлах.
+    """
+    # Создаем директорию, если ее нет
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Определяем имя файла из URL, удаляя параметры запроса
+    file_name = pdf_link.split('/')[-1]
+    if '?' in file_name:
+        file_name = file_name.split('?')[0]
+
+    file_path = os.path.join(output_dir, file_name)
+
+    # Условный запрос: сервер ответит 304, если файл не изменился
+    headers = {}
+    entry = manifest.get(pdf_link) if manifest else None
+    if entry and os.path.exists(file_path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    # Скачиваем PDF-файл с помощью requests (более надежно для больших файлов)
+    http = session or requests
+    with http.get(pdf_link, stream=True, timeout=30, headers=headers) as pdf_response:
+        if pdf_response.status_code == 304:
+            print(f"Учебный план не изменился: {file_path}")
+            return file_path
+        pdf_response.raise_for_status()
+        # Пишем во временный файл и атомарно заменяем, чтобы бот не прочитал недокачанный PDF
+        tmp_path = file_path + '.part'
+        with open(tmp_path, 'wb') as f:
+            for chunk in pdf_response.iter_content(chunk_size=8192):
+                f.write(chunk)
+        os.replace(tmp_path, file_path)
+        if manifest:
+            manifest.put(pdf_link, file_name, pdf_response)
+    print(f"Учебный план успешно скачан и сохранен как: {file_path}")
+    return file_path
+
+def _iter_json_strings(data, path=""):
+    """Обходит JSON и возвращает пары (путь к значению, строка)."""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _iter_json_strings(value, f"{path}/{key}")
+    elif isinstance(data, list):
+        for value in data:
+            yield from _iter_json_strings(value, path)
+    elif isinstance(data, str):
+        yield path, data
+
+def find_study_plan_link_http(url, session=None):
+    """
+    Находит ссылку на PDF учебного плана без браузера: по встроенным данным
+    страницы (__NEXT_DATA__) или по ссылкам в разметке.
+
+    Аргументы:
+    url (str): URL страницы программы.
+    session (requests.Session): HTTP-сессия.
+    """
+    http = session or requests
+    try:
+        response = http.get(url, timeout=30)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Не удалось загрузить страницу {url} без браузера: {e}")
+        return None
+
+    soup = BeautifulSoup(response.text, 'html.parser')
+    next_data = soup.find('script', id='__NEXT_DATA__')
+    if next_data and next_data.string:
+        try:
+            candidates = [
+                (path, value) for path, value in _iter_json_strings(json.loads(next_data.string))
+                if PDF_URL_RE.search(value) and "exams" not in value.lower()
+            ]
+        except ValueError:
+            candidates = []
+        # Предпочитаем значения, путь к которым указывает на учебный план
+        candidates.sort(key=lambda item: "plan" not in item[0].lower())
+        if candidates:
+            pdf_link = urljoin(url, candidates[0][1])
+            print(f"PDF ссылка найдена во встроенных данных страницы: {pdf_link}")
+            return pdf_link
+
+    pdf_link = find_pdf_link_in_page(response.text, url)
+    if pdf_link:
+        print(f"PDF ссылка найдена в разметке страницы: {pdf_link}")
+    return pdf_link
+
+def find_study_plan_link_with_browser(url, output_dir="study_plans", driver_pool=None):
+    """
+    Находит ссылку на PDF учебного плана, используя Selenium для имитации клика по кнопке.
+
+    Аргументы:
+    url (str): URL страницы программы.
+    output_dir (str): Директория для сохранения PDF-файлов.
+    driver_pool (DriverPool): Пул браузеров; если не задан, создается отдельный браузер.
+    """
+    print(f"Попытка найти учебный план на: {url} с использованием Selenium.")
+
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = DriverPool(1, output_dir)
+    try:
+        with driver_pool.driver() as driver:
+            pdf_link = find_study_plan_link(driver, url)
+        if not pdf_link:
+            print(f"PDF ссылка на учебный план не найдена после клика по кнопке на странице: {url}")
+        return pdf_link
+
+    except TimeoutException:
+        print(f"Таймаут: Кнопка 'Скачать учебный план' не найдена или не стала кликабельной на странице: {url}")
+        return None
+    except NoSuchElementException:
+        print(f"Элемент не найден: Кнопка 'Скачать учебный план' не найдена на странице: {url}")
+        return None
     except Exception as e:
         print(f"Произошла непредвиденная ошибка при использовании Selenium: {e}")
         return None
     finally:
-        if driver:
-            driver.quit() # Всегда закрываем браузер
+        if own_pool:
+            driver_pool.close() # Всегда закрываем браузер
+
+def download_study_plan(url, output_dir="study_plans", driver_pool=None, session=None, manifest=None, use_browser=True):
+    """
+    Скачивает учебный план в формате PDF с указанного URL. Сначала ссылка ищется
+    обычным HTTP-запросом, и только если это не удалось - с помощью Selenium.
+
+    Аргументы:
+    url (str): URL страницы, с которой нужно скачать учебный план.
+    output_dir (str): Директория для сохранения PDF-файлов.
+    driver_pool (DriverPool): Пул браузеров; если не задан, создается отдельный браузер.
+    session (requests.Session): HTTP-сессия для загрузки страниц и PDF.
+    manifest (DownloadManifest): Сведения о ранее скачанных файлах для условных запросов.
+    use_browser (bool): Использовать ли Selenium, если ссылку не удалось найти без браузера.
+    """
+    print(f"Попытка загрузки учебного плана с: {url}")
+
+    pdf_link = find_study_plan_link_http(url, session)
+    if not pdf_link and use_browser:
+        if webdriver is None:
+            print("Selenium не установлен, поиск ссылки с помощью браузера невозможен.")
+        else:
+            pdf_link = find_study_plan_link_with_browser(url, output_dir, driver_pool)
+    if not pdf_link:
+        print(f"PDF ссылка на учебный план не найдена на странице: {url}")
+        return None
+
+    try:
+        return download_pdf(pdf_link, output_dir, session, manifest)
+    except requests.RequestException as e:
+        print(f"Ошибка при скачивании учебного плана {pdf_link}: {e}")
+        return None
+
+def discover_program_urls(session=None, list_url=PROGRAMS_LIST_URL):
+    """
+    Находит URL-ы всех магистерских программ на странице со списком программ.
+
+    Аргументы:
+    session (requests.Session): HTTP-сессия.
+    list_url (str): URL страницы со списком программ.
+    """
+    http = session or requests
+    try:
+        response = http.get(list_url, timeout=30)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Не удалось получить список программ с {list_url}: {e}")
+        return []
+    # Ссылки ищем и в разметке, и во встроенных данных страницы
+    paths = PROGRAM_URL_RE.findall(response.text)
+    urls = list(dict.fromkeys(urljoin(list_url, path) for path in paths))
+    print(f"Найдено программ: {len(urls)}")
+    return urls
+
+def crawl_study_plans(urls, output_dir="study_plans", workers=4, use_browser=True):
+    """
+    Параллельно скачивает учебные планы нескольких программ, используя одну
+    HTTP-сессию и, при необходимости, браузеры из общего пула. Неизмененные
+    PDF-файлы повторно не скачиваются.
+
+    Аргументы:
+    urls (list): URL-ы страниц программ.
+    output_dir (str): Директория для сохранения PDF-файлов.
+    workers (int): Количество параллельных загрузок (и максимальное число браузеров).
+    use_browser (bool): Использовать ли Selenium, если ссылку не удалось найти без браузера.
+    """
+    workers = max(1, min(workers, len(urls)))
+    # Браузеры пула запускаются, только если понадобятся
+    driver_pool = DriverPool(workers, output_dir)
+    session = create_session(workers)
+    manifest = DownloadManifest(output_dir)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda url: download_study_plan(url, output_dir, driver_pool, session, manifest, use_browser), urls
+            )
+            return [file for file in results if file]
+    finally:
+        manifest.save()
+        driver_pool.close()
+        session.close()
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Скачивание учебных планов магистерских программ ИТМО.")
+    arg_parser.add_argument("urls", nargs="*", help="URL-ы страниц программ (по умолчанию - ai и ai_product)")
+    arg_parser.add_argument("--all", action="store_true", help="Скачать учебные планы всех магистерских программ")
+    arg_parser.add_argument("--workers", type=int, default=4, help="Количество параллельных загрузок")
+    arg_parser.add_argument("--output-dir", default="study_plans", help="Директория для сохранения PDF-файлов")
+    arg_parser.add_argument("--no-browser", action="store_true", help="Не использовать Selenium, только HTTP-запросы")
+    args = arg_parser.parse_args()
+
     # URL-ы магистерских программ
-    program_urls = [
-        "https://abit.itmo.ru/program/master/ai",
-        "https://abit.itmo.ru/program/master/ai_product"
-    ]
-
-    downloaded_files = []
-    for url in program_urls:
-        file = download_study_plan(url)
-        if file:
-            downloaded_files.append(file)
+    program_urls = args.urls or DEFAULT_PROGRAM_URLS
+    if args.all:
+        program_urls = discover_program_urls() or program_urls
+
+    downloaded_files = crawl_study_plans(program_urls, args.output_dir, args.workers, use_browser=not args.no_browser)
 
     if downloaded_files:
         print("\nВсе учебные планы, которые удалось скачать:")
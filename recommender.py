@@ -0,0 +1,174 @@
+import re
+import logging
+
+from retrieval import tokenize
+from course_table import CourseTable, PROGRAM_SLUGS, program_slug
+
+logger = logging.getLogger(__name__)
+
+# Разделы учебного плана с дисциплинами и практиками по выбору
+ELECTIVE_SECTION_RE = re.compile(r"выборн|по выбору", re.IGNORECASE)
+
+# Сколько дисциплин по выбору предлагается по умолчанию
+DEFAULT_TOP_ELECTIVES = 5
+
+PROGRAM_TITLES = {slug: title for title, slug in PROGRAM_SLUGS.items()}
+
+
+def _terms(text: str) -> list:
+    """Термы текста без чисел и однобуквенных слов, которые не различают программы."""
+    return [term for term in tokenize(text) if len(term) > 1 and not term.isdigit()]
+
+
+class ProgramRecommender:
+    """
+    Подбор программы и дисциплин по выбору по описанию опыта абитуриента.
+
+    При загрузке учебных планов для каждой программы (по всему тексту плана) и
+    для каждой дисциплины по выбору (по ее названию) строится TF-IDF вектор.
+    Векторы нормированы, поэтому косинусная близость к описанию абитуриента -
+    это произведение матрицы векторов на вектор запроса. В запросе обычно
+    несколько термов, и используются только соответствующие им столбцы матрицы,
+    поэтому подбор занимает доли миллисекунды и не требует LLM.
+    """
+
+    def __init__(self, study_plan_texts: dict, course_table: CourseTable):
+        import numpy as np # Импортируется только при построении векторов, не замедляя запуск бота
+        programs = {}
+        for filename, text in study_plan_texts.items():
+            text = str(text)
+            programs[program_slug(filename, text)] = text
+        self.programs = list(programs)
+
+        # Дисциплины по выбору из таблицы дисциплин; одна дисциплина программы учитывается один раз
+        self.electives = []
+        seen = set()
+        for row_id in range(len(course_table)):
+            row = course_table.row(row_id)
+            key = (row['program'], row['course'])
+            if ELECTIVE_SECTION_RE.search(row['section']) and key not in seen:
+                seen.add(key)
+                self.electives.append(row)
+
+        documents = [_terms(text) for text in programs.values()]
+        documents += [_terms(row['course']) for row in self.electives]
+        self.vocabulary = {}
+        for terms in documents:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for doc_id, terms in enumerate(documents):
+            np.add.at(counts[doc_id], [self.vocabulary[term] for term in terms], 1)
+        # Сглаженный IDF по всем документам: программам и дисциплинам по выбору
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = np.zeros_like(counts)
+        nonzero = counts > 0
+        weights[nonzero] = 1 + np.log(counts[nonzero])
+        weights *= self.idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        weights /= np.where(norms > 0, norms, 1)
+
+        self.program_vectors = weights[:len(self.programs)]
+        self.elective_vectors = weights[len(self.programs):]
+        logger.info(f"Векторы для рекомендаций построены: {len(self.programs)} программ, "
+                    f"{len(self.electives)} дисциплин по выбору, {len(self.vocabulary)} термов.")
+
+    def to_snapshot(self) -> tuple[dict, dict]:
+        """Возвращает метаданные (программы, термы, дисциплины по выбору) и матрицы для снимка."""
+        meta = {'programs': self.programs, 'terms': list(self.vocabulary), 'electives': self.electives}
+        arrays = {'idf': self.idf, 'program_vectors': self.program_vectors, 'elective_vectors': self.elective_vectors}
+        return meta, arrays
+
+    @classmethod
+    def from_snapshot(cls, meta: dict, arrays: dict) -> "ProgramRecommender":
+        """
+        Восстанавливает подбор из данных снимка. Матрицы не копируются: массивы
+        NumPy используют память переданных буферов (отображенного в память файла).
+
+        Аргументы:
+        meta (dict): Метаданные из to_snapshot.
+        arrays (dict): Буферы матриц из to_snapshot (матрицы могут быть переданы
+            одномерными: их размеры известны из метаданных).
+        """
+        import numpy as np
+        recommender = cls.__new__(cls)
+        recommender.programs = meta['programs']
+        recommender.vocabulary = {term: term_id for term_id, term in enumerate(meta['terms'])}
+        recommender.electives = meta['electives']
+        recommender.idf = np.asarray(arrays['idf'])
+        terms = len(recommender.idf)
+        recommender.program_vectors = np.asarray(arrays['program_vectors']).reshape(len(recommender.programs), terms)
+        recommender.elective_vectors = np.asarray(arrays['elective_vectors']).reshape(len(recommender.electives), terms)
+        return recommender
+
+    def recommend(self, background: str, top_electives: int = DEFAULT_TOP_ELECTIVES) -> dict | None:
+        """
+        Ранжирует программы и подбирает дисциплины по выбору по описанию опыта.
+
+        Аргументы:
+        background (str): Описание опыта и интересов абитуриента.
+        top_electives (int): Сколько дисциплин по выбору предложить.
+
+        Возвращает:
+        dict | None: {'programs': [(программа, близость), ...] по убыванию близости,
+            'electives': [(запись таблицы дисциплин, близость), ...]} или None,
+            если в описании нет ни одного терма из учебных планов.
+        """
+        import numpy as np
+        term_ids = {}
+        for term in _terms(background):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                term_ids[term_id] = term_ids.get(term_id, 0) + 1
+        if not term_ids:
+            return None
+
+        columns = np.fromiter(term_ids, dtype=np.intp, count=len(term_ids))
+        query = (1 + np.log(np.fromiter(term_ids.values(), dtype=np.float32, count=len(term_ids)))) * self.idf[columns]
+        query /= np.linalg.norm(query)
+
+        program_scores = self.program_vectors[:, columns] @ query
+        programs = [(self.programs[i], float(program_scores[i])) for i in np.argsort(-program_scores)]
+
+        electives = []
+        if len(self.electives) and top_electives > 0:
+            elective_scores = self.elective_vectors[:, columns] @ query
+            top = min(top_electives, len(self.electives))
+            candidates = np.argpartition(-elective_scores, top - 1)[:top]
+            for i in candidates[np.argsort(-elective_scores[candidates])]:
+                if elective_scores[i] > 0:
+                    electives.append((self.electives[i], float(elective_scores[i])))
+        return {'programs': programs, 'electives': electives}
+
+
+def build_recommender(study_plan_texts: dict, course_table: CourseTable | None) -> ProgramRecommender | None:
+    """
+    Строит векторы для рекомендаций, если установлен NumPy и учебные планы загружены.
+
+    Возвращает:
+    ProgramRecommender | None: Готовый подбор или None, если построить его нельзя.
+    """
+    if not study_plan_texts or course_table is None:
+        return None
+    try:
+        import numpy # noqa: F401 - NumPy нужен только для рекомендаций, без него бот работает без команды /recommend
+    except ImportError:
+        logger.warning("NumPy не установлен, команда /recommend недоступна.")
+        return None
+    return ProgramRecommender(study_plan_texts, course_table)
+
+
+def format_recommendation(result: dict) -> str:
+    """Форматирует результат подбора для ответа пользователю."""
+    lines = ["Программы в порядке соответствия вашему опыту:"]
+    for i, (program, score) in enumerate(result['programs'], 1):
+        lines.append(f"{i}. {PROGRAM_TITLES.get(program, program)} ({program}) - совпадение {score:.0%}")
+    if result['electives']:
+        lines.append("")
+        lines.append("Дисциплины по выбору, которые могут быть вам интересны:")
+        for row, score in result['electives']:
+            semesters = ", ".join(str(n) for n in row['semesters'])
+            lines.append(f"- {row['course']} ({row['program']}, семестр {semesters}, {row['credits']} з.е.)")
+    return "\n".join(lines)
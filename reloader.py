@@ -0,0 +1,141 @@
+import os
+import asyncio
+import logging
+
+from pdf_processor import process_study_plans
+from retrieval import StudyPlanIndex
+from course_table import CourseTable
+from recommender import build_recommender
+from answer_cache import corpus_version
+
+logger = logging.getLogger(__name__)
+
+# Интервал проверки директории с учебными планами по умолчанию (в секундах)
+DEFAULT_RELOAD_INTERVAL = 30.0
+
+
+def build_corpus(study_plan_texts: dict) -> dict:
+    """
+    Строит по текстам учебных планов все производные структуры.
+
+    Аргументы:
+    study_plan_texts (dict): Словарь имя файла -> извлеченный текст.
+
+    Возвращает:
+    dict: Значения для bot_data: тексты, поисковый индекс, таблица дисциплин,
+        векторы для рекомендаций и версия учебных планов.
+    """
+    course_table = CourseTable.from_texts(study_plan_texts) if study_plan_texts else None
+    return {
+        'study_plan_texts': study_plan_texts,
+        'study_plan_index': StudyPlanIndex(study_plan_texts) if study_plan_texts else None,
+        'course_table': course_table,
+        'recommender': build_recommender(study_plan_texts, course_table),
+        'plan_version': corpus_version(study_plan_texts),
+    }
+
+
+def scan_study_plans(pdf_dir: str) -> dict:
+    """
+    Возвращает отпечаток директории: размер и время изменения каждого PDF-файла.
+
+    Аргументы:
+    pdf_dir (str): Директория с PDF-файлами учебных планов.
+
+    Возвращает:
+    dict: Словарь имя файла -> (размер, время изменения в наносекундах).
+    """
+    snapshot = {}
+    try:
+        entries = list(os.scandir(pdf_dir))
+    except FileNotFoundError:
+        return snapshot
+    for entry in entries:
+        if entry.name.lower().endswith(".pdf") and entry.is_file():
+            stat = entry.stat()
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+class StudyPlanWatcher:
+    """
+    Следит за директорией с учебными планами и при появлении новых, изменении
+    или удалении PDF-файлов перестраивает данные бота без перезапуска.
+
+    Извлечение текста и построение индексов выполняются в пуле потоков, не
+    блокируя цикл событий; благодаря кэшу извлечения заново обрабатываются
+    только измененные файлы. Новые данные подменяются в bot_data одним
+    синхронным обновлением, поэтому обработчики, уже получившие ссылки на
+    старые данные, дорабатывают с ними. Если задан on_reload, он вызывается
+    в пуле потоков с новыми данными до их подмены (например, чтобы сохранить
+    снимок для рабочих процессов).
+    """
+
+    def __init__(self, bot_data: dict, pdf_dir: str = "study_plans", interval: float = DEFAULT_RELOAD_INTERVAL, on_reload=None):
+        self.bot_data = bot_data
+        self.pdf_dir = pdf_dir
+        self.interval = interval
+        self.on_reload = on_reload
+        self.loaded_snapshot = scan_study_plans(pdf_dir)
+        self.reloads = 0
+        self._task = None
+
+    def start(self) -> None:
+        """Запускает фоновую проверку директории в текущем цикле событий."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую проверку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        previous = self.loaded_snapshot
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                snapshot = await asyncio.to_thread(scan_study_plans, self.pdf_dir)
+                # Перезагружаем, только когда изменения закончились: файл, который еще
+                # копируется или скачивается, меняет размер между проверками
+                if snapshot != self.loaded_snapshot and snapshot == previous:
+                    await self.reload(snapshot)
+                previous = snapshot
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении учебных планов: {e}")
+
+    async def reload(self, snapshot: dict | None = None) -> None:
+        """
+        Заново загружает учебные планы и подменяет данные бота.
+
+        Аргументы:
+        snapshot (dict | None): Отпечаток директории, по которому выполняется загрузка.
+        """
+        if snapshot is None:
+            snapshot = await asyncio.to_thread(scan_study_plans, self.pdf_dir)
+        changed = sorted(
+            name for name in snapshot.keys() | self.loaded_snapshot.keys()
+            if snapshot.get(name) != self.loaded_snapshot.get(name)
+        )
+        logger.info(f"Учебные планы изменились ({', '.join(changed)}), обновление данных...")
+
+        study_plan_texts = await asyncio.to_thread(process_study_plans, self.pdf_dir)
+        if not study_plan_texts and self.bot_data.get('study_plan_texts'):
+            logger.warning("Не удалось загрузить ни одного учебного плана, бот продолжит работать с прежними данными.")
+            self.loaded_snapshot = snapshot
+            return
+        corpus = await asyncio.to_thread(build_corpus, study_plan_texts)
+        if self.on_reload is not None:
+            await asyncio.to_thread(self.on_reload, corpus)
+
+        # Одно синхронное обновление между точками ожидания цикла событий:
+        # обработчики видят либо все старые, либо все новые данные
+        self.bot_data.update(corpus)
+        self.loaded_snapshot = snapshot
+        self.reloads += 1
+        logger.info(f"Учебные планы обновлены: загружено {len(study_plan_texts)}.")
@@ -0,0 +1,341 @@
+import re
+import math
+import heapq
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Параметры ранжирования BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Слова обрезаются до этой длины - грубый, но быстрый стемминг для русского языка,
+# чтобы "семестр", "семестре" и "семестров" давали один и тот же терм
+STEM_LENGTH = 6
+
+# Среднее количество символов на токен LLM, используется для оценки размера промпта
+CHARS_PER_TOKEN = 3
+
+# Максимальная длина фрагмента уровня семестра/модуля
+MAX_SECTION_CHARS = 1500
+
+# Сколько найденных дисциплин одного раздела заменяются фрагментом всего раздела
+SECTION_PROMOTION_HITS = 3
+
+TOKEN_RE = re.compile(r"\w+")
+PROGRAM_TITLE_RE = re.compile(r"ОП\s+(.+?)\s*Семестры старта")
+# Строка дисциплины начинается с номера семестра (или списка семестров, например "1, 2, 3")
+COURSE_LINE_RE = re.compile(r"^\d(?:,\s*\d)*\D")
+
+
+def tokenize(text: str) -> list:
+    """
+    Разбивает текст на нормализованные термы для поиска.
+
+    Аргументы:
+    text (str): Исходный текст.
+
+    Возвращает:
+    list: Список термов в нижнем регистре, обрезанных до STEM_LENGTH символов.
+    """
+    return [token[:STEM_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительно оценивает количество токенов LLM в тексте."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def program_title(filename: str, text: str) -> str:
+    """
+    Определяет название образовательной программы по тексту учебного плана.
+
+    Аргументы:
+    filename (str): Имя PDF-файла (используется, если название не найдено).
+    text (str): Извлеченный текст учебного плана.
+
+    Возвращает:
+    str: Название программы.
+    """
+    match = PROGRAM_TITLE_RE.search(text[:500])
+    return match.group(1) if match else filename
+
+
+class Chunk:
+    """
+    Фрагмент учебного плана. Текст не копируется: хранится только диапазон
+    символов в исходном тексте, заголовок (программа и раздел) и, для дисциплин,
+    фрагмент раздела, в котором она находится.
+    """
+    __slots__ = ('doc', 'start', 'end', 'title', 'parent')
+
+    def __init__(self, doc: str, start: int, end: int, title: str, parent: "Chunk | None" = None):
+        self.doc = doc
+        self.start = start
+        self.end = end
+        self.title = title
+        self.parent = parent
+
+    def contains(self, other: "Chunk") -> bool:
+        """Проверяет, входит ли другой фрагмент в этот."""
+        return self.doc == other.doc and self.start <= other.start and other.end <= self.end
+
+
+def split_into_chunks(filename: str, text: str) -> list:
+    """
+    Разбивает текст учебного плана на фрагменты двух уровней: разделы (модули,
+    пулы дисциплин одного семестра) и отдельные дисциплины. Идущие подряд строки
+    заголовков объединяются с первым следующим за ними разделом. Заголовком
+    дисциплины служит заголовок раздела, в котором она находится.
+
+    Аргументы:
+    filename (str): Имя PDF-файла.
+    text (str): Извлеченный текст учебного плана.
+
+    Возвращает:
+    list: Список объектов Chunk.
+    """
+    program = program_title(filename, text)
+    chunks = []
+    section_title = program
+    # Заголовок фрагмента-раздела: программа, если фрагмент начинается со строки
+    # заголовка раздела, иначе (продолжение длинного раздела) - заголовок раздела
+    section_chunk_title = program
+    section_start = 0
+    section_courses = []
+    position = 0
+
+    def close_section(end: int) -> None:
+        if end > section_start:
+            section = Chunk(filename, section_start, end, section_chunk_title)
+            chunks.append(section)
+            for course in section_courses:
+                course.parent = section
+            chunks.extend(section_courses)
+
+    for line in text.splitlines(keepends=True):
+        line_start, position = position, position + len(line)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if COURSE_LINE_RE.match(stripped):
+            section_courses.append(Chunk(filename, line_start, line_start + len(line.rstrip()), section_title))
+            if position - section_start > MAX_SECTION_CHARS:
+                close_section(position)
+                section_start, section_courses = position, []
+                section_chunk_title = section_title
+        else:
+            if section_courses:
+                close_section(line_start)
+                section_start, section_courses = line_start, []
+                section_chunk_title = program
+            section_title = f"{program} / {stripped}"
+    close_section(position)
+    return chunks
+
+
+class StudyPlanIndex:
+    """
+    Инвертированный индекс по фрагментам учебных планов с ранжированием BM25.
+    Строится один раз при загрузке учебных планов.
+
+    Фрагменты, списки вхождений термов, IDF и длины фрагментов хранятся в
+    плоских массивах (списки вхождений всех термов подряд, границы списка
+    терма - в posting_offsets). Поэтому индекс сохраняется в снимок учебных
+    планов без сериализации объектов и читается прямо из отображенного в
+    память файла (см. to_snapshot и from_snapshot).
+    """
+
+    def __init__(self, texts: dict):
+        self.texts = texts
+        chunks = []
+        for filename, text in texts.items():
+            chunks.extend(split_into_chunks(filename, text))
+
+        self.docs = list(texts)
+        self.titles = []
+        doc_ids = {name: doc_id for doc_id, name in enumerate(self.docs)}
+        title_ids = {}
+        chunk_ids = {id(chunk): chunk_id for chunk_id, chunk in enumerate(chunks)}
+        self.chunk_doc = array('H')
+        self.chunk_start = array('I')
+        self.chunk_end = array('I')
+        self.chunk_title = array('I')
+        # Номер фрагмента-раздела, в котором находится дисциплина (-1 у самих разделов)
+        self.chunk_parent = array('i')
+        for chunk in chunks:
+            title_id = title_ids.get(chunk.title)
+            if title_id is None:
+                title_id = title_ids[chunk.title] = len(self.titles)
+                self.titles.append(chunk.title)
+            self.chunk_doc.append(doc_ids[chunk.doc])
+            self.chunk_start.append(chunk.start)
+            self.chunk_end.append(chunk.end)
+            self.chunk_title.append(title_id)
+            self.chunk_parent.append(chunk_ids[id(chunk.parent)] if chunk.parent is not None else -1)
+        # Фрагменты уровня раздела (в порядке документов) - запасной контекст,
+        # если по запросу ничего не найдено
+        self.sections = array('I', (chunk_id for chunk_id, parent in enumerate(self.chunk_parent) if parent < 0))
+
+        postings = {}
+        self.lengths = array('I')
+        for chunk_id in range(len(chunks)):
+            terms = tokenize(self.titles[self.chunk_title[chunk_id]] + " " + self.chunk_text(chunk_id))
+            self.lengths.append(len(terms))
+            frequencies = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, []).append((chunk_id, frequency))
+
+        total = len(chunks)
+        self.avg_length = sum(self.lengths) / total if total else 0.0
+        self.vocabulary = {}
+        self.posting_offsets = array('I', [0])
+        self.posting_chunks = array('I')
+        self.posting_freqs = array('I')
+        self.idf = array('d')
+        for term, term_postings in postings.items():
+            self.vocabulary[term] = len(self.idf)
+            self.idf.append(math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5)))
+            for chunk_id, frequency in term_postings:
+                self.posting_chunks.append(chunk_id)
+                self.posting_freqs.append(frequency)
+            self.posting_offsets.append(len(self.posting_chunks))
+        logger.info(f"Построен поисковый индекс: {total} фрагментов, {len(self.vocabulary)} термов.")
+
+    def to_snapshot(self) -> tuple[dict, dict]:
+        """
+        Возвращает данные индекса для снимка: небольшие метаданные (имена
+        документов, заголовки, термы) и плоские массивы. Тексты не включаются.
+        """
+        meta = {'docs': self.docs, 'titles': self.titles, 'terms': list(self.vocabulary), 'avg_length': self.avg_length}
+        arrays = {
+            name: getattr(self, name)
+            for name in ('chunk_doc', 'chunk_start', 'chunk_end', 'chunk_title', 'chunk_parent', 'sections',
+                         'lengths', 'posting_offsets', 'posting_chunks', 'posting_freqs', 'idf')
+        }
+        return meta, arrays
+
+    @classmethod
+    def from_snapshot(cls, texts, meta: dict, arrays: dict) -> "StudyPlanIndex":
+        """
+        Восстанавливает индекс из данных снимка. Массивы (например, memoryview
+        отображенного в память файла) используются как есть, без копирования.
+
+        Аргументы:
+        texts: Словарь имя файла -> текст учебного плана.
+        meta (dict): Метаданные из to_snapshot.
+        arrays (dict): Массивы из to_snapshot.
+        """
+        index = cls.__new__(cls)
+        index.texts = texts
+        index.docs = meta['docs']
+        index.titles = meta['titles']
+        index.vocabulary = {term: term_id for term_id, term in enumerate(meta['terms'])}
+        index.avg_length = meta['avg_length']
+        for name, values in arrays.items():
+            setattr(index, name, values)
+        return index
+
+    def chunk(self, chunk_id: int) -> Chunk:
+        """Возвращает фрагмент по номеру."""
+        parent_id = self.chunk_parent[chunk_id]
+        return Chunk(
+            self.docs[self.chunk_doc[chunk_id]], self.chunk_start[chunk_id], self.chunk_end[chunk_id],
+            self.titles[self.chunk_title[chunk_id]], self.chunk(parent_id) if parent_id >= 0 else None,
+        )
+
+    def chunk_text(self, chunk_id: int) -> str:
+        """Возвращает текст фрагмента."""
+        return self.texts[self.docs[self.chunk_doc[chunk_id]]][self.chunk_start[chunk_id]:self.chunk_end[chunk_id]]
+
+    def render(self, chunk_id: int) -> str:
+        """Форматирует фрагмент для вставки в промпт."""
+        return f"[{self.titles[self.chunk_title[chunk_id]]}]\n{self.chunk_text(chunk_id)}"
+
+    def _contains(self, chunk_id: int, other_id: int) -> bool:
+        """Проверяет, входит ли фрагмент other_id во фрагмент chunk_id."""
+        return (
+            self.chunk_doc[chunk_id] == self.chunk_doc[other_id]
+            and self.chunk_start[chunk_id] <= self.chunk_start[other_id]
+            and self.chunk_end[other_id] <= self.chunk_end[chunk_id]
+        )
+
+    def _score(self, query: str, top_k: int) -> list:
+        """Возвращает пары (номер фрагмента, оценка BM25) лучших фрагментов по убыванию оценки."""
+        scores = {}
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            idf = self.idf[term_id]
+            for position in range(self.posting_offsets[term_id], self.posting_offsets[term_id + 1]):
+                chunk_id = self.posting_chunks[position]
+                frequency = self.posting_freqs[position]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / self.avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def search(self, query: str, top_k: int = 8) -> list:
+        """
+        Находит наиболее релевантные запросу фрагменты.
+
+        Аргументы:
+        query (str): Текст запроса.
+        top_k (int): Максимальное количество фрагментов.
+
+        Возвращает:
+        list: Список пар (оценка, Chunk), отсортированный по убыванию оценки.
+        """
+        return [(score, self.chunk(chunk_id)) for chunk_id, score in self._score(query, top_k)]
+
+    def build_context(self, query: str, top_k: int = 8, token_budget: int = 3000) -> str:
+        """
+        Собирает контекст для LLM из наиболее релевантных фрагментов, не превышая
+        бюджет токенов. Если по запросу ничего не найдено, в контекст попадают
+        разделы учебных планов по порядку, пока позволяет бюджет.
+
+        Аргументы:
+        query (str): Вопрос пользователя.
+        top_k (int): Максимальное количество фрагментов.
+        token_budget (int): Максимальный размер контекста в токенах.
+
+        Возвращает:
+        str: Текст контекста.
+        """
+        candidates = [chunk_id for chunk_id, _ in self._score(query, top_k)]
+        if not candidates:
+            candidates = self.sections
+        else:
+            # Если найдено несколько дисциплин одного раздела, вместо них
+            # в контекст попадает весь раздел
+            per_section = {}
+            for chunk_id in candidates:
+                parent_id = self.chunk_parent[chunk_id]
+                if parent_id >= 0:
+                    per_section[parent_id] = per_section.get(parent_id, 0) + 1
+            candidates = [
+                self.chunk_parent[chunk_id]
+                if self.chunk_parent[chunk_id] >= 0 and per_section[self.chunk_parent[chunk_id]] >= SECTION_PROMOTION_HITS
+                else chunk_id
+                for chunk_id in candidates
+            ]
+
+        selected = []
+        used_tokens = 0
+        for chunk_id in candidates:
+            if any(self._contains(other, chunk_id) for other in selected):
+                continue
+            # Раздел поглощает ранее выбранные дисциплины из него
+            absorbed = [other for other in selected if self._contains(chunk_id, other)]
+            freed = sum(estimate_tokens(self.render(other)) for other in absorbed)
+            cost = estimate_tokens(self.render(chunk_id))
+            if used_tokens - freed + cost > token_budget:
+                continue
+            for other in absorbed:
+                selected.remove(other)
+            selected.append(chunk_id)
+            used_tokens += cost - freed
+        return "\n\n".join(self.render(chunk_id) for chunk_id in selected)
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import logging
+
+from answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(question: str, context_text: str) -> str:
+    """
+    Формирует ключ запроса к LLM: нормализованный вопрос и отпечаток контекста.
+
+    Аргументы:
+    question (str): Вопрос пользователя.
+    context_text (str): Контекст учебных планов, попавший в промпт.
+
+    Возвращает:
+    str: Ключ для объединения одинаковых запросов.
+    """
+    fingerprint = hashlib.sha1(context_text.encode('utf-8')).hexdigest()[:16]
+    return f"{fingerprint}:{normalize_question(question)}"
+
+
+class LeaderCancelled(Exception):
+    """Запрос, к которому присоединились ожидающие, был отменен запустившим его обработчиком."""
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов: пока запрос с некоторым
+    ключом выполняется, остальные запросы с тем же ключом не запускаются,
+    а ожидают и получают его результат (или исключение). Если обработчик,
+    запустивший запрос, отменен (пользователь ушел, бот останавливается),
+    ожидающие не отменяются вместе с ним: один из них запускает запрос заново,
+    остальные присоединяются к нему.
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.calls = 0
+        self.saved = 0
+
+    async def do(self, key: str, fn) -> tuple:
+        """
+        Выполняет fn или присоединяется к уже выполняющемуся запросу с тем же ключом.
+
+        Аргументы:
+        key (str): Ключ запроса.
+        fn: Функция без аргументов, возвращающая корутину запроса.
+
+        Возвращает:
+        tuple: Пара (результат, shared), где shared - True, если результат
+            получен от запроса, запущенного другим обработчиком.
+        """
+        while (future := self.in_flight.get(key)) is not None:
+            self.saved += 1
+            try:
+                # shield: отмена ожидающего обработчика не должна отменять общий запрос
+                return await asyncio.shield(future), True
+            except LeaderCancelled:
+                # Запрос отменен: первый проснувшийся ожидающий запускает его заново
+                self.saved -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Помечаем исключение полученным, даже если других ожидающих не было
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self.in_flight[key]
+
+    def stats(self) -> dict:
+        """Возвращает количество выполненных и сэкономленных запросов."""
+        return {'calls': self.calls, 'saved': self.saved, 'in_flight': len(self.in_flight)}
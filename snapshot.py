@@ -0,0 +1,274 @@
+import os
+import json
+import mmap
+import asyncio
+import struct
+import logging
+from collections.abc import Mapping
+
+from retrieval import StudyPlanIndex
+from course_table import CourseTable
+from recommender import ProgramRecommender
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"ITMOSNP2"
+SNAPSHOT_HEADER = struct.Struct("<8sQ")
+
+# Путь к снимку учебных планов по умолчанию
+DEFAULT_SNAPSHOT_PATH = os.path.join("study_plans", ".corpus_snapshot.bin")
+
+# Тексты хранятся в кодировке фиксированной ширины, чтобы срез текста по
+# номерам символов (как в фрагментах поискового индекса) читался из снимка
+# напрямую, без декодирования всего текста
+TEXT_ENCODING = "utf-32-le"
+BYTES_PER_CHAR = 4
+
+# Граница выравнивания массивов в снимке (для чтения чисел на месте)
+ARRAY_ALIGNMENT = 8
+
+
+class MappedText:
+    """
+    Текст учебного плана внутри отображенного в память снимка. Поддерживает
+    len() и срезы по номерам символов; декодируется только запрошенный участок.
+    """
+
+    __slots__ = ('buffer', 'offset', 'length')
+
+    def __init__(self, buffer: mmap.mmap, offset: int, length: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, key) -> str:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                return str(self)[key]
+        else:
+            if key < 0:
+                key += self.length
+            if not 0 <= key < self.length:
+                raise IndexError("MappedText index out of range")
+            start, stop = key, key + 1
+        if stop <= start:
+            return ""
+        begin = self.offset + start * BYTES_PER_CHAR
+        return self.buffer[begin:begin + (stop - start) * BYTES_PER_CHAR].decode(TEXT_ENCODING)
+
+    def __str__(self) -> str:
+        return self[:]
+
+
+class MappedTexts(Mapping):
+    """Словарь имя файла -> MappedText только для чтения поверх снимка."""
+
+    def __init__(self, buffer: mmap.mmap, layout: dict):
+        self._texts = {name: MappedText(buffer, offset, length) for name, (offset, length) in layout.items()}
+
+    def __getitem__(self, name: str) -> MappedText:
+        return self._texts[name]
+
+    def __iter__(self):
+        return iter(self._texts)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def write_snapshot(path: str, corpus: dict) -> None:
+    """
+    Сохраняет учебные планы и построенные по ним структуры в файл снимка.
+    Файл записывается во временный и атомарно заменяет прежний, поэтому
+    процессы, отобразившие старый снимок в память, продолжают с ним работать.
+
+    Поисковый индекс, таблица дисциплин и векторы для рекомендаций хранятся
+    плоскими числовыми массивами (описание массивов и небольшие метаданные -
+    в JSON-заголовке), а не сериализованными объектами: при загрузке они
+    читаются прямо из отображенного файла, и из снимка никогда не
+    выполняется код.
+
+    Аргументы:
+    path (str): Путь к файлу снимка.
+    corpus (dict): Данные учебных планов (результат build_corpus).
+    """
+    study_plan_texts = corpus['study_plan_texts']
+    layout = {}
+    blobs = []
+    offset = 0
+    for name, text in study_plan_texts.items():
+        blob = text.encode(TEXT_ENCODING)
+        layout[name] = (offset, len(text))
+        blobs.append(blob)
+        offset += len(blob)
+    texts_size = offset
+
+    # Смещения массивов отсчитываются от начала области массивов после текстов
+    structures = {}
+    arrays = []
+    offset = 0
+    for key in ('study_plan_index', 'course_table', 'recommender'):
+        structure = corpus.get(key)
+        if structure is None:
+            structures[key] = None
+            continue
+        meta, structure_arrays = structure.to_snapshot()
+        descriptions = {}
+        for name, values in structure_arrays.items():
+            view = memoryview(values)
+            if not view.c_contiguous:
+                raise ValueError(f"Массив {key}.{name} должен располагаться в памяти непрерывно")
+            offset = _align(offset)
+            descriptions[name] = (offset, view.format, view.nbytes)
+            arrays.append((offset, view.cast('B')))
+            offset += view.nbytes
+        structures[key] = {'meta': meta, 'arrays': descriptions}
+
+    header = json.dumps({
+        'plan_version': corpus.get('plan_version'),
+        'texts': layout,
+        'texts_size': texts_size,
+        'structures': structures,
+    }, ensure_ascii=False).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(header)))
+        f.write(header)
+        f.write(bytes(_align(f.tell()) - f.tell()))
+        for blob in blobs:
+            f.write(blob)
+        arrays_offset = _align(f.tell())
+        for array_offset, view in arrays:
+            f.write(bytes(arrays_offset + array_offset - f.tell()))
+            f.write(view)
+    os.replace(tmp_path, path)
+    logger.info(f"Снимок учебных планов сохранен в {path}: {len(study_plan_texts)} планов, {os.path.getsize(path)} байт.")
+
+
+def load_snapshot(path: str) -> dict:
+    """
+    Отображает снимок учебных планов в память только для чтения. Тексты и
+    массивы индекса, таблицы дисциплин и векторов для рекомендаций не
+    копируются в память процесса: они читаются прямо из отображенного файла,
+    страницы которого разделяются всеми процессами, открывшими снимок.
+
+    Аргументы:
+    path (str): Путь к файлу снимка.
+
+    Возвращает:
+    dict: Значения для bot_data, как у build_corpus.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, header_size = SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"Файл {path} не является снимком учебных планов")
+    header = json.loads(buffer[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + header_size])
+    texts_offset = _align(SNAPSHOT_HEADER.size + header_size)
+    layout = {name: (texts_offset + offset, length) for name, (offset, length) in header['texts'].items()}
+    study_plan_texts = MappedTexts(buffer, layout)
+
+    arrays_offset = _align(texts_offset + header['texts_size'])
+    view = memoryview(buffer)
+    if len(view) < arrays_offset:
+        raise ValueError(f"Снимок учебных планов {path} поврежден")
+
+    def structure(key: str):
+        description = header['structures'][key]
+        if description is None:
+            return None, None
+        arrays = {}
+        for name, (offset, fmt, nbytes) in description['arrays'].items():
+            begin = arrays_offset + offset
+            if begin + nbytes > len(view):
+                raise ValueError(f"Снимок учебных планов {path} поврежден")
+            arrays[name] = view[begin:begin + nbytes].cast(fmt)
+        return description['meta'], arrays
+
+    study_plan_index = None
+    meta, arrays = structure('study_plan_index')
+    if meta is not None:
+        study_plan_index = StudyPlanIndex.from_snapshot(study_plan_texts, meta, arrays)
+    course_table = None
+    meta, arrays = structure('course_table')
+    if meta is not None:
+        course_table = CourseTable.from_snapshot(meta, arrays)
+    recommender = None
+    meta, arrays = structure('recommender')
+    if meta is not None:
+        try:
+            recommender = ProgramRecommender.from_snapshot(meta, arrays)
+        except ImportError:
+            logger.warning("NumPy не установлен, команда /recommend недоступна.")
+    return {
+        'study_plan_texts': study_plan_texts,
+        'study_plan_index': study_plan_index,
+        'course_table': course_table,
+        'recommender': recommender,
+        'plan_version': header['plan_version'],
+    }
+
+
+class SnapshotWatcher:
+    """
+    Следит за файлом снимка и, когда он заменяется новым, отображает новый
+    снимок и подменяет данные бота одним синхронным обновлением. Используется
+    в рабочих процессах вместо StudyPlanWatcher: PDF-файлы обрабатывает только
+    главный процесс, который и перезаписывает снимок.
+    """
+
+    def __init__(self, bot_data: dict, path: str, interval: float):
+        self.bot_data = bot_data
+        self.path = path
+        self.interval = interval
+        self.loaded_stat = self._stat()
+        self._task = None
+
+    def _stat(self) -> tuple | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> None:
+        """Запускает фоновую проверку снимка в текущем цикле событий."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую проверку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            stat = self._stat()
+            if stat is None or stat == self.loaded_stat:
+                continue
+            try:
+                corpus = await asyncio.to_thread(load_snapshot, self.path)
+            except Exception as e:
+                logger.error(f"Не удалось загрузить новый снимок учебных планов: {e}")
+                continue
+            # Старое отображение закрывается, когда на него не останется ссылок
+            # у обработчиков, начатых до подмены
+            self.bot_data.update(corpus)
+            self.loaded_stat = stat
+            logger.info(f"Загружен новый снимок учебных планов: {len(corpus['study_plan_texts'])} планов.")
@@ -0,0 +1,126 @@
+import time
+import logging
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from delivery import OutboundScheduler, find_split_point
+
+logger = logging.getLogger(__name__)
+
+# Текст сообщения-заглушки, которое отправляется до получения первого фрагмента ответа
+PLACEHOLDER_TEXT = "…"
+
+# Минимальный интервал между редактированиями одного сообщения (в секундах),
+# чтобы не превышать ограничения Telegram на частоту запросов
+STREAM_EDIT_INTERVAL = 1.0
+
+
+class StreamingReply:
+    """
+    Ответ пользователю, который отображается по мере генерации: сначала
+    отправляется сообщение-заглушка, затем оно редактируется не чаще одного раза
+    в STREAM_EDIT_INTERVAL секунд. Когда текст превышает max_length, текущее
+    сообщение завершается и продолжение отправляется новым сообщением.
+
+    Если передан планировщик, заглушка, редактирования и новые сообщения
+    отправляются через его очередь чата, поэтому при множестве одновременных
+    потоковых ответов соблюдаются общие и поканальные ограничения Telegram.
+    """
+
+    def __init__(self, message: Message, max_length: int, edit_interval: float = STREAM_EDIT_INTERVAL,
+                 scheduler: OutboundScheduler | None = None, chat_id: int | None = None):
+        self.message = message
+        self.max_length = max_length
+        self.edit_interval = edit_interval
+        self.scheduler = scheduler
+        self.chat_id = chat_id if chat_id is not None else message.chat_id
+        self.parts = []
+        self.current = None
+        self.current_text = ""
+        self.shown_text = ""
+        self.last_edit = 0.0
+
+    async def _send(self, send):
+        """Выполняет запрос к Telegram через планировщик, если он задан."""
+        if self.scheduler is not None:
+            return await self.scheduler.submit(self.chat_id, send)
+        return await send()
+
+    async def start(self) -> None:
+        """Отправляет сообщение-заглушку."""
+        self.current = await self._send(lambda: self.message.reply_text(PLACEHOLDER_TEXT))
+        self.last_edit = time.monotonic()
+
+    async def _edit(self, text: str) -> None:
+        if not text.strip() or text == self.shown_text:
+            return
+        try:
+            current = self.current
+            await self._send(lambda: current.edit_text(text))
+        except BadRequest as e:
+            # "Message is not modified" и подобные ошибки не мешают продолжить вывод
+            logger.warning(f"Не удалось обновить сообщение с ответом: {e}")
+        self.shown_text = text
+        self.last_edit = time.monotonic()
+
+    async def append(self, fragment: str) -> None:
+        """
+        Добавляет очередной фрагмент ответа и при необходимости обновляет сообщение.
+
+        Аргументы:
+        fragment (str): Фрагмент текста ответа.
+        """
+        self.parts.append(fragment)
+        self.current_text += fragment
+        while len(self.current_text) > self.max_length:
+            split = find_split_point(self.current_text, self.max_length)
+            await self._edit(self.current_text[:split].rstrip())
+            self.current_text = self.current_text[split:].lstrip()
+            first_text = self.current_text[:self.max_length] or PLACEHOLDER_TEXT
+            self.current = await self._send(lambda: self.message.reply_text(first_text))
+            self.shown_text = self.current_text[:self.max_length]
+            self.last_edit = time.monotonic()
+        if time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._edit(self.current_text)
+
+    async def consume(self, fragments) -> str:
+        """
+        Отправляет заглушку и выводит все фрагменты ответа из асинхронного генератора.
+
+        Аргументы:
+        fragments: Асинхронный генератор фрагментов текста.
+
+        Возвращает:
+        str: Полный текст ответа.
+        """
+        await self.start()
+        async for fragment in fragments:
+            await self.append(fragment)
+        return await self.finish()
+
+    async def finish(self) -> str:
+        """
+        Выводит оставшийся текст ответа.
+
+        Возвращает:
+        str: Полный текст ответа.
+        """
+        await self._edit(self.current_text)
+        return "".join(self.parts)
+
+    async def fail(self, text: str) -> None:
+        """
+        Сообщает об ошибке: заменяет заглушку текстом ошибки или, если часть
+        ответа уже была выведена, отправляет его отдельным сообщением.
+
+        Аргументы:
+        text (str): Текст сообщения об ошибке.
+        """
+        if self.current is None:
+            await self._send(lambda: self.message.reply_text(text))
+        elif self.current_text.strip():
+            await self._edit(self.current_text)
+            await self._send(lambda: self.message.reply_text(text))
+        else:
+            await self._edit(text)
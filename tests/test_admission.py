@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+async def blocked_call(admission, chat_id, release, order=None, user_id=None):
+    async def fn():
+        if order is not None:
+            order.append(chat_id)
+        await release.wait()
+        return chat_id
+    return await admission.run(chat_id if user_id is None else user_id, chat_id, fn)
+
+
+async def returns(value):
+    return value
+
+
+def test_user_rate_is_limited():
+    async def test():
+        admission = AdmissionController(user_rate=1 / 60, user_burst=2)
+        assert await admission.run(1, 1, lambda: returns("a")) == "a"
+        assert await admission.run(1, 1, lambda: returns("b")) == "b"
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.run(1, 1, lambda: returns("c"))
+        assert rejected.value.reason == "user_rate" and rejected.value.retry_after > 0
+        # Частота ограничена для каждого пользователя отдельно
+        assert await admission.run(2, 2, lambda: returns("d")) == "d"
+        return admission.stats()
+
+    assert asyncio.run(test()) == {'active': 0, 'queued': 0, 'admitted': 3, 'rejected': 1}
+
+
+def test_full_queue_rejects_immediately():
+    async def test():
+        admission = AdmissionController(max_active=1, max_queued=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(blocked_call(admission, 1, release))
+        queued = asyncio.create_task(blocked_call(admission, 2, release))
+        await asyncio.sleep(0)
+        assert admission.stats()['active'] == 1 and admission.stats()['queued'] == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.run(3, 3, lambda: returns(3))
+        assert rejected.value.reason == "queue_full"
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    assert asyncio.run(test()) == [1, 2]
+
+
+def test_queued_chats_are_served_round_robin():
+    async def test():
+        admission = AdmissionController(max_active=1, user_burst=10)
+        release = asyncio.Event()
+        order = []
+        blocker = asyncio.create_task(blocked_call(admission, 0, release, order))
+        await asyncio.sleep(0)
+        # Чат 1 отправил три сообщения раньше, чем чат 2 - одно
+        tasks = [asyncio.create_task(blocked_call(admission, 1, release, order)) for _ in range(3)]
+        tasks.append(asyncio.create_task(blocked_call(admission, 2, release, order)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert asyncio.run(test()) == [0, 1, 2, 1, 1]
+
+
+def test_cancelled_request_leaves_queue():
+    async def test():
+        admission = AdmissionController(max_active=1, max_queued=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(blocked_call(admission, 1, release))
+        queued = asyncio.create_task(blocked_call(admission, 2, release))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert admission.stats()['queued'] == 0
+        # Освободившееся место в очереди можно занять
+        replacement = asyncio.create_task(blocked_call(admission, 3, release))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(running, replacement)
+        return results, admission.stats()
+
+    results, stats = asyncio.run(test())
+    assert results == [1, 3]
+    assert stats['active'] == 0 and stats['queued'] == 0
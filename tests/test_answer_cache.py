@@ -0,0 +1,58 @@
+import answer_cache
+import bot
+from answer_cache import AnswerCache, normalize_question
+
+
+def test_near_identical_questions_share_entry():
+    assert normalize_question("Сколько  стоит обучение?!") == normalize_question("сколько стоит, обучение")
+    assert normalize_question("Учёба") == normalize_question("учеба")
+    cache = AnswerCache()
+    cache.put("Какие есть общежития?", "v1", "Есть.")
+    assert cache.get("какие есть общежития", "v1") == "Есть."
+    assert cache.stats()['entries'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("первый", "v1", "1")
+    cache.put("второй", "v1", "2")
+    assert cache.get("первый", "v1") == "1" # "второй" становится самым давно использованным
+    cache.put("третий", "v1", "3")
+    assert cache.get("второй", "v1") is None
+    assert cache.get("первый", "v1") == "1" and cache.get("третий", "v1") == "3"
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl=60)
+    cache.put("вопрос", "v1", "ответ")
+    now[0] += 59
+    assert cache.get("вопрос", "v1") == "ответ"
+    now[0] += 2
+    assert cache.get("вопрос", "v1") is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_plan_version_change_invalidates_cache():
+    cache = AnswerCache()
+    cache.put("вопрос", "v1", "старый ответ")
+    assert cache.get("вопрос", "v2") is None
+    assert cache.stats()['entries'] == 0
+    # Ответ, полученный по старой версии учебных планов, не сохраняется
+    cache.put("вопрос", "v1", "старый ответ")
+    assert cache.get("вопрос", "v2") is None
+
+
+def test_save_and_load_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "answers.json")
+    monkeypatch.setenv("ANSWER_CACHE_PATH", path)
+    cache = bot.build_bot_data("test")['answer_cache']
+    cache.put("Какие есть общежития?", "v1", "Есть.")
+    cache.save()
+
+    loaded = bot.build_bot_data("test")['answer_cache']
+    assert loaded.path == path
+    assert loaded.get("какие есть общежития", "v1") == "Есть."
+    assert loaded.get("какие есть общежития", "v2") is None
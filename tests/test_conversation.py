@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+import bot
+import conversation
+from answer_cache import AnswerCache
+from benchmark import FakeGeminiServer, FakeUpdate, FakeContext
+from conversation import ConversationStore, is_follow_up, SUMMARY_HEADER
+from llm_client import GeminiClient
+
+PLAN_TEXTS = {"a.pdf": "ОП ТестСеместры старта\nБлок 1. Модули 3108\n1Машинное обучение 3108"}
+
+
+@pytest.mark.parametrize("question", [
+    "А во втором семестре?",
+    "И сколько в нем часов?",
+    "Расскажи подробнее",
+    "Почему?",
+    "What about its electives?",
+])
+def test_follow_up_questions(question):
+    assert is_follow_up(question)
+
+
+@pytest.mark.parametrize("question", [
+    "Какие дисциплины изучаются в первом семестре?",
+    "Чем отличаются программы Искусственный интеллект и AI Product?",
+    "Есть ли в программе курсы по управлению продуктом?",
+])
+def test_standalone_questions(question):
+    assert not is_follow_up(question)
+
+
+def test_standalone_question_uses_answer_cache_after_history():
+    async def test():
+        server = FakeGeminiServer(latency=0.0, jitter=0.0)
+        await server.start()
+        client = GeminiClient("test", base_url=server.base_url)
+        context = FakeContext({
+            "study_plan_texts": PLAN_TEXTS, "llm_client": client, "plan_version": "v1",
+            "answer_cache": AnswerCache(), "conversation_store": ConversationStore(),
+        })
+        try:
+            for question in ("Какие есть курсы по машинному обучению?", "Есть ли практика в компании?",
+                             "Какие есть курсы по машинному обучению?", "А в первом семестре?"):
+                await bot.handle_message(FakeUpdate(1, question), context)
+        finally:
+            await client.aclose()
+            await server.stop()
+        return server.requests
+
+    # Повторный самостоятельный вопрос берется из кэша, уточняющий уходит в LLM
+    assert asyncio.run(test()) == 3
+
+
+def conversation_tokens(store, chat_id):
+    state = store.conversations[chat_id]
+    return state.tokens + state.summary_tokens
+
+
+def test_history_stays_within_token_budget():
+    store = ConversationStore(token_budget=200, summary_budget=60)
+    for i in range(30):
+        store.add(1, f"Вопрос номер {i} о программе?", f"Ответ номер {i}. " + "Подробности. " * 10)
+        assert conversation_tokens(store, 1) <= 200
+    # Последний вопрос всегда хранится целиком
+    assert "Абитуриент: Вопрос номер 29 о программе?" in store.history(1)
+
+
+def test_old_turns_roll_into_summary_and_oldest_lines_are_dropped():
+    store = ConversationStore(token_budget=120, summary_budget=40)
+    for i in range(10):
+        store.add(1, f"Вопрос {i}?", f"Ответ {i}. Второе предложение ответа {i}. " + "Текст. " * 8)
+    history = store.history(1)
+    state = store.conversations[1]
+    assert history.startswith(SUMMARY_HEADER)
+    assert state.summary_tokens <= 40
+    # В краткое содержание попадает только первое предложение ответа, самые старые строки удалены
+    assert "- Вопрос 0?" not in history
+    assert f"- Вопрос {10 - len(state.turns) - 1}? — Ответ {10 - len(state.turns) - 1}." in history
+    assert "Второе предложение ответа 0" not in history
+
+
+def test_store_evicts_least_recent_chats():
+    store = ConversationStore(max_chats=2)
+    store.add(1, "вопрос", "ответ")
+    store.add(2, "вопрос", "ответ")
+    store.add(1, "еще вопрос", "ответ") # Чат 2 становится самым давно активным
+    store.add(3, "вопрос", "ответ")
+    assert list(store.conversations) == [1, 3]
+    assert store.stats()['evictions'] == 1
+
+
+def test_store_evicts_when_text_limit_exceeded():
+    store = ConversationStore(max_chars=100)
+    store.add(1, "вопрос", "а" * 60)
+    store.add(2, "вопрос", "б" * 60)
+    assert list(store.conversations) == [2]
+    assert store.chars == store.conversations[2].chars <= 100
+
+
+def test_idle_chats_expire(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(conversation.time, "monotonic", lambda: now[0])
+    store = ConversationStore(idle_ttl=60)
+    store.add(1, "вопрос", "ответ")
+    now[0] = 30
+    store.add(2, "вопрос", "ответ")
+    now[0] = 70
+    assert store.history(1) == ""
+    assert store.history(2) != ""
+    assert store.stats() == {'chats': 1, 'chars': store.conversations[2].chars, 'evictions': 1}
+
+
+def test_reset_command_clears_history():
+    store = ConversationStore()
+    store.add(1, "вопрос", "ответ")
+    store.add(2, "вопрос", "ответ")
+    update = FakeUpdate(1, "/reset")
+    asyncio.run(bot.reset_command(update, FakeContext({"conversation_store": store})))
+    assert store.history(1) == "" and store.history(2) != ""
+    assert store.chars == store.conversations[2].chars
+    assert update.message.replies
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from benchmark import QUESTIONS
+from course_table import CourseTable
+from pdf_processor import process_study_plans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLAN_TEXT = """Учебный план
+ОП Управление ИИ-продуктами/AI ProductСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Пул выборных дисциплин. 1 семестр 12432
+1Основы машинного обучения 3108
+1Базы данных 3108
+1Основы глубокого обучения 3108
+Пул выборных дисциплин. 3 семестр 12432
+3Глубокое обучение 6216
+Пул выборных дисциплин. 2 семестр 12432
+2Метрики и аналитика продукта 3108
+2Инженерия данных 6216
+"""
+
+
+@pytest.fixture(scope="module")
+def table():
+    return CourseTable.from_texts({"10130-abit.pdf": PLAN_TEXT})
+
+
+@pytest.mark.parametrize("question", [
+    "Сейчас я изучаю базы данных, стоит ли идти в ai?",
+    "Я часто работаю с базами данных, подойдет ли мне ai_product?",
+    "Почему во втором семестре так много курсов?",
+    "Какие экзамены в 1 семестре?",
+    "Что лучше выбрать во 2 семестре?",
+])
+def test_open_questions_go_to_llm(table, question):
+    assert table.answer(question) is None
+
+
+@pytest.mark.parametrize("question, semester", [
+    ("Какие дисциплины во 2 семестре ai_product?", 2),
+    ("Список дисциплин первого семестра", 1),
+    ("Что изучают в 1 семестре?", 1),
+    ("what is in semester 2 of ai_product", 2),
+    ("Which courses are in the first semester?", 1),
+])
+def test_semester_listing(table, question, semester):
+    answer = table.answer(question)
+    assert answer is not None and answer.startswith(f"Дисциплины {semester} семестра:")
+
+
+@pytest.mark.parametrize("question", [
+    "Сколько кредитов у дисциплины Инженерия данных?",
+    "Сколько часов у курса Инженерия данных?",
+    "Какая трудоемкость у Инженерии данных?",
+])
+def test_course_effort(table, question):
+    assert table.answer(question) == "«Инженерия данных» (ai_product, семестр 2, Пул выборных дисциплин. 2 семестр): 6 з.е., 216 ч."
+
+
+def test_inflected_sub_name_is_dropped(table):
+    # «Глубокое обучение» в другой словоформе входит в «Основы глубокого обучения»
+    assert table.answer("Сколько часов у Основы глубокого обучения в ai_product") == \
+        "«Основы глубокого обучения» (ai_product, семестр 1, Пул выборных дисциплин. 1 семестр): 3 з.е., 108 ч."
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_benchmark_questions_go_to_llm(question):
+    # Нагрузочный тест измеряет путь через LLM: ни один его вопрос не отвечается по таблице дисциплин
+    table = CourseTable.from_texts(process_study_plans(os.path.join(ROOT, "study_plans")))
+    assert table.answer(question) is None
+    assert table.answer(f"{question} (абитуриент 7)") is None
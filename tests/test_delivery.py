@@ -0,0 +1,93 @@
+import time
+import asyncio
+import datetime
+
+import pytest
+from telegram.error import RetryAfter
+
+from delivery import OutboundScheduler, split_message
+
+
+def test_short_message_is_not_split():
+    assert split_message("Короткий ответ.", 100) == ["Короткий ответ."]
+
+
+def test_parts_fit_limit_and_keep_text():
+    text = "\n\n".join(f"Абзац {i}. " + "Предложение о программе. " * 5 for i in range(20))
+    parts = split_message(text, 200)
+    assert len(parts) > 1
+    assert all(len(part) <= 200 for part in parts)
+    assert "".join(parts).replace(" ", "").replace("\n", "") == text.replace(" ", "").replace("\n", "")
+
+
+def test_split_prefers_paragraph_boundaries():
+    first = "Первый абзац. " * 5
+    second = "Второй абзац. " * 5
+    parts = split_message(f"{first.strip()}\n\n{second.strip()}", len(first) + 10)
+    assert parts == [first.strip(), second.strip()]
+
+
+def test_text_without_break_points_is_cut_at_limit():
+    parts = split_message("а" * 250, 100)
+    assert [len(part) for part in parts] == [100, 100, 50]
+
+
+async def sent(text):
+    return text
+
+
+def timed_sends(scheduler_options, chat_ids):
+    async def test():
+        scheduler = OutboundScheduler(**scheduler_options)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(scheduler.submit(chat_id, lambda i=i: sent(i)) for i, chat_id in enumerate(chat_ids)))
+        return results, time.perf_counter() - start
+
+    return asyncio.run(test())
+
+
+def test_chat_rate_is_limited_per_chat():
+    options = {'global_rate': 1000, 'chat_rate': 10, 'chat_burst': 1}
+    results, elapsed = timed_sends(options, [1] * 4)
+    assert results == [0, 1, 2, 3] # Сообщения чата отправляются по порядку
+    assert elapsed >= 0.25
+    # Разные чаты не ждут друг друга
+    _, elapsed = timed_sends(options, [1, 2, 3, 4])
+    assert elapsed < 0.1
+
+
+def test_global_rate_is_shared_by_all_chats():
+    _, elapsed = timed_sends({'global_rate': 20, 'chat_rate': 1000, 'chat_burst': 1000}, range(30))
+    # Первые 20 сообщений уходят сразу, остальные 10 - со скоростью 20 в секунду
+    assert elapsed >= 0.4
+
+
+def test_send_is_retried_after_retry_after():
+    calls = []
+
+    async def send():
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            raise RetryAfter(datetime.timedelta(seconds=0.1))
+        return "ok"
+
+    async def test():
+        return await OutboundScheduler().submit(1, send)
+
+    assert asyncio.run(test()) == "ok"
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.1
+
+
+def test_retry_after_is_raised_when_attempts_run_out():
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise RetryAfter(datetime.timedelta(seconds=0.01))
+
+    async def test():
+        return await OutboundScheduler().submit(1, send)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(test())
+    assert len(calls) == 3
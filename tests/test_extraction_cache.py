@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+import pdf_processor
+from extraction_cache import ExtractionCache, EXTRACTOR_VERSION
+from pdf_processor import process_study_plans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANS = os.path.join(ROOT, "study_plans")
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    for name in ("10033-abit.pdf", "10130-abit.pdf"):
+        shutil.copy(os.path.join(PLANS, name), tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Имена файлов, текст которых действительно извлекался из PDF."""
+    names = []
+    extract = pdf_processor._extract_sequential
+
+    def recording(pending):
+        names.extend(pending)
+        return extract(pending)
+
+    monkeypatch.setattr(pdf_processor, "_extract_sequential", recording)
+    return names
+
+
+def test_unchanged_files_are_read_from_cache(pdf_dir, extracted):
+    first = process_study_plans(str(pdf_dir), max_workers=1)
+    assert sorted(extracted) == ["10033-abit.pdf", "10130-abit.pdf"]
+    extracted.clear()
+    assert process_study_plans(str(pdf_dir), max_workers=1) == first
+    assert extracted == []
+
+
+def test_replaced_file_is_extracted_again(pdf_dir, extracted):
+    first = process_study_plans(str(pdf_dir), max_workers=1)
+    extracted.clear()
+    shutil.copy(os.path.join(PLANS, "10130-abit.pdf"), pdf_dir / "10033-abit.pdf")
+    texts = process_study_plans(str(pdf_dir), max_workers=1)
+    assert extracted == ["10033-abit.pdf"]
+    assert texts["10033-abit.pdf"] == first["10130-abit.pdf"]
+
+
+def test_entry_of_deleted_pdf_is_removed(pdf_dir):
+    process_study_plans(str(pdf_dir), max_workers=1)
+    os.remove(pdf_dir / "10130-abit.pdf")
+    assert list(process_study_plans(str(pdf_dir), max_workers=1)) == ["10033-abit.pdf"]
+    assert list(ExtractionCache(str(pdf_dir)).entries) == ["10033-abit.pdf"]
+
+
+def test_extractor_version_change_invalidates_cache(tmp_path):
+    pdf_path = tmp_path / "plan.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 test")
+    cache = ExtractionCache(str(tmp_path))
+    cache.put("plan.pdf", cache.fingerprint("plan.pdf", str(pdf_path)), "текст")
+    cache.save()
+
+    same = ExtractionCache(str(tmp_path))
+    assert same.get("plan.pdf", same.fingerprint("plan.pdf", str(pdf_path))) == "текст"
+    newer = ExtractionCache(str(tmp_path), version=EXTRACTOR_VERSION + 1)
+    assert newer.entries == {} and newer.dirty
+    assert newer.get("plan.pdf", newer.fingerprint("plan.pdf", str(pdf_path))) is None
@@ -0,0 +1,57 @@
+import time
+import asyncio
+
+import bot
+from benchmark import FakeUpdate, FakeContext
+
+PLAN_TEXTS = {"10130-abit.pdf": """ОП Управление ИИ-продуктами/AI ProductСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Пул выборных дисциплин. 2 семестр 12432
+2Инженерия данных 6216
+"""}
+QUESTION = "Сколько часов у курса Инженерия данных?"
+
+
+def slow_study_plans(delay):
+    def process_study_plans():
+        time.sleep(delay)
+        return PLAN_TEXTS
+    return process_study_plans
+
+
+def test_asks_to_retry_while_corpus_is_loading(monkeypatch):
+    monkeypatch.setattr(bot, "process_study_plans", slow_study_plans(0.5))
+
+    async def test():
+        bot_data = {'corpus_ready': asyncio.Event(), 'warmup_wait': 0.05}
+        loading = asyncio.create_task(bot.load_corpus(bot_data))
+        update = FakeUpdate(1, QUESTION)
+        start = time.perf_counter()
+        await bot.handle_message(update, FakeContext(bot_data))
+        elapsed = time.perf_counter() - start
+        await loading
+        return update.message.replies, elapsed
+
+    replies, elapsed = asyncio.run(test())
+    assert replies == [bot.WARMING_UP_TEXT]
+    assert elapsed < 0.4
+
+
+def test_question_is_answered_once_corpus_is_loaded(monkeypatch):
+    monkeypatch.setattr(bot, "process_study_plans", slow_study_plans(0.1))
+
+    async def test():
+        bot_data = {'corpus_ready': asyncio.Event(), 'warmup_wait': 5.0}
+        loading = asyncio.create_task(bot.load_corpus(bot_data))
+        # Вопрос, заданный во время загрузки, дожидается ее окончания
+        waiting = FakeUpdate(1, QUESTION)
+        await bot.handle_message(waiting, FakeContext(bot_data))
+        await loading
+        after = FakeUpdate(2, QUESTION)
+        await bot.handle_message(after, FakeContext(bot_data))
+        return waiting.message.replies, after.message.replies, bot_data
+
+    waiting, after, bot_data = asyncio.run(test())
+    assert bot_data['corpus_ready'].is_set() and bot_data['study_plan_texts'] == PLAN_TEXTS
+    assert waiting == after
+    assert waiting[0].startswith("«Инженерия данных» (ai_product, семестр 2")
@@ -0,0 +1,82 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import bot
+from benchmark import FakeGeminiServer, FakeUpdate, FakeContext
+from llm_client import GeminiClient
+from admission import AdmissionController
+from metrics import Metrics
+
+PAYLOAD = {"contents": [{"role": "user", "parts": [{"text": "вопрос"}]}]}
+PLAN_TEXTS = {"a.pdf": "ОП ТестСеместры старта\nБлок 1. Модули 3108\n1Курс экзаменов 3108"}
+
+
+async def with_server(test, **server_options):
+    server = FakeGeminiServer(jitter=0.0, **server_options)
+    await server.start()
+    client = GeminiClient("test", base_url=server.base_url, backoff_base=0.01)
+    try:
+        return await test(server, client)
+    finally:
+        await client.aclose()
+        await server.stop()
+
+
+def test_calls_run_concurrently():
+    async def test(server, client):
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client.generate_content(PAYLOAD) for _ in range(5)))
+        return time.perf_counter() - start, results
+
+    elapsed, results = asyncio.run(with_server(test, latency=0.2))
+    assert all(result["candidates"] for result in results)
+    assert elapsed < 0.6
+
+
+def test_retries_then_raises_on_503():
+    async def test(server, client):
+        client.max_retries = 2
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.generate_content(PAYLOAD)
+        return server.requests
+
+    assert asyncio.run(with_server(test, latency=0.0, error_rate=1.0)) == 3
+
+
+def test_handle_message_serves_chats_while_llm_call_in_flight():
+    async def test(server, client):
+        context = FakeContext({"study_plan_texts": PLAN_TEXTS, "llm_client": client})
+        updates = [FakeUpdate(user_id, f"Вопрос абитуриента {user_id}") for user_id in range(4)]
+        start = time.perf_counter()
+        await asyncio.gather(*(bot.handle_message(update, context) for update in updates))
+        return time.perf_counter() - start, updates
+
+    elapsed, updates = asyncio.run(with_server(test, latency=0.3))
+    assert all(update.message.replies for update in updates)
+    assert elapsed < 0.9
+
+
+def test_application_processes_updates_concurrently():
+    application = bot.build_application("123:test", "test")
+    assert application.concurrent_updates > 1
+
+
+def test_llm_stage_excludes_admission_wait():
+    async def test(server, client):
+        metrics = Metrics()
+        context = FakeContext({
+            "study_plan_texts": PLAN_TEXTS, "llm_client": client, "metrics": metrics,
+            "admission": AdmissionController(max_active=1, metrics=metrics),
+        })
+        updates = [FakeUpdate(user_id, f"Вопрос абитуриента {user_id}") for user_id in range(3)]
+        await asyncio.gather(*(bot.handle_message(update, context) for update in updates))
+        return metrics.histograms
+
+    histograms = asyncio.run(with_server(test, latency=0.2))
+    llm = histograms['bot_stage_seconds'][(('stage', 'llm'),)]
+    wait = next(iter(histograms['bot_admission_wait_seconds'].values()))
+    assert llm.count == 3 and max(llm.recent) < 0.35
+    assert max(wait.recent) > 0.3
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+
+from metrics import Metrics, MetricsServer
+
+
+def test_prometheus_exposition_format():
+    metrics = Metrics()
+    metrics.inc('bot_answers_total', source='cache')
+    metrics.inc('bot_answers_total', 2, source='llm')
+    metrics.set_gauge('bot_admission_queue_depth', 3)
+    for value in (0.003, 0.02, 0.02, 0.7, 40.0):
+        metrics.observe('bot_stage_seconds', value, stage='llm')
+    lines = metrics.render_prometheus().splitlines()
+
+    assert "# HELP bot_answers_total Ответы по источнику" in lines
+    assert "# TYPE bot_answers_total counter" in lines
+    assert 'bot_answers_total{source="cache"} 1' in lines
+    assert 'bot_answers_total{source="llm"} 2' in lines
+    assert "# TYPE bot_admission_queue_depth gauge" in lines
+    assert "bot_admission_queue_depth 3" in lines
+    assert "# TYPE bot_stage_seconds histogram" in lines
+    # Корзины накопительные, последняя (+Inf) равна числу наблюдений
+    assert 'bot_stage_seconds_bucket{stage="llm",le="0.005"} 1' in lines
+    assert 'bot_stage_seconds_bucket{stage="llm",le="0.025"} 3' in lines
+    assert 'bot_stage_seconds_bucket{stage="llm",le="1.0"} 4' in lines
+    assert 'bot_stage_seconds_bucket{stage="llm",le="30.0"} 4' in lines
+    assert 'bot_stage_seconds_bucket{stage="llm",le="+Inf"} 5' in lines
+    assert 'bot_stage_seconds_count{stage="llm"} 5' in lines
+    assert any(line.startswith('bot_stage_seconds_sum{stage="llm"} 40.74') for line in lines)
+
+
+def test_histogram_percentiles():
+    metrics = Metrics()
+    for value in range(1, 101):
+        metrics.observe('bot_prompt_tokens', value)
+    histogram = metrics.histograms['bot_prompt_tokens'][()]
+    assert (histogram.percentile(50), histogram.percentile(95), histogram.percentile(99)) == (51, 96, 100)
+    assert "bot_prompt_tokens: n=100, p50=51, p95=96, p99=100" in metrics.summary()
+
+
+def test_metrics_server_serves_metrics():
+    async def test():
+        metrics = Metrics()
+        metrics.inc('bot_answers_total', source='llm')
+        server = MetricsServer(metrics, port=0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                return await client.get("/metrics"), await client.get("/other")
+        finally:
+            await server.stop()
+
+    response, missing = asyncio.run(test())
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/plain; version=0.0.4")
+    assert 'bot_answers_total{source="llm"} 1' in response.text
+    assert missing.status_code == 404
@@ -0,0 +1,46 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from course_table import CourseTable
+from recommender import build_recommender, format_recommendation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AI_TEXT = """ОП Искусственный интеллектСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Пул выборных дисциплин. 1 семестр 12432
+1Компьютерное зрение 3108
+1Глубокое обучение нейронных сетей 3108
+1Обработка естественного языка 3108
+"""
+PRODUCT_TEXT = """ОП Управление ИИ-продуктами/AI ProductСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Пул выборных дисциплин. 1 семестр 12432
+1Стратегический продуктовый менеджмент 3108
+1Основы маркетинга для ИИ-продуктов 3108
+1Метрики и аналитика продукта 3108
+"""
+
+
+def test_bot_import_does_not_load_numpy():
+    code = "import sys, bot; sys.exit('numpy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
+
+
+def test_recommend_ranks_programs_and_electives():
+    pytest.importorskip("numpy")
+    texts = {"10033-abit.pdf": AI_TEXT, "10130-abit.pdf": PRODUCT_TEXT}
+    recommender = build_recommender(texts, CourseTable.from_texts(texts))
+
+    result = recommender.recommend("Работаю продакт-менеджером, занимаюсь маркетингом и аналитикой продукта")
+    assert [program for program, _ in result['programs']] == ["ai_product", "ai"]
+    assert result['electives'][0][0]['program'] == "ai_product"
+
+    result = recommender.recommend("Занимался компьютерным зрением и нейронными сетями")
+    assert result['programs'][0][0] == "ai"
+    assert "Компьютерное зрение" in format_recommendation(result)
+
+    assert recommender.recommend("hello world") is None
@@ -0,0 +1,44 @@
+import os
+import time
+import shutil
+import asyncio
+
+from answer_cache import AnswerCache, corpus_version
+from pdf_processor import process_study_plans
+from reloader import StudyPlanWatcher, build_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANS = os.path.join(ROOT, "study_plans")
+
+
+def test_watcher_swaps_corpus_when_pdf_changes(tmp_path):
+    shutil.copy(os.path.join(PLANS, "10033-abit.pdf"), tmp_path / "plan.pdf")
+    bot_data = build_corpus(process_study_plans(str(tmp_path)))
+    old_version = bot_data['plan_version']
+    cache = bot_data['answer_cache'] = AnswerCache()
+    cache.put("Какие есть курсы?", old_version, "Старый ответ.")
+
+    async def test():
+        watcher = StudyPlanWatcher(bot_data, pdf_dir=str(tmp_path), interval=0.05)
+        watcher.start()
+        try:
+            # Файл заменяется учебным планом другой программы
+            shutil.copy(os.path.join(PLANS, "10130-abit.pdf"), tmp_path / "plan.pdf")
+            deadline = time.monotonic() + 30
+            while watcher.reloads == 0 and time.monotonic() < deadline:
+                # Обработчик в любой момент видит согласованные данные: старые или новые целиком
+                assert bot_data['study_plan_index'].texts is bot_data['study_plan_texts']
+                assert bot_data['plan_version'] == corpus_version(bot_data['study_plan_texts'])
+                await asyncio.sleep(0.01)
+        finally:
+            await watcher.stop()
+        return watcher.reloads
+
+    assert asyncio.run(test()) == 1
+    texts = bot_data['study_plan_texts']
+    # Тексты, индекс, таблица дисциплин и версия относятся к новому учебному плану
+    assert bot_data['plan_version'] == corpus_version(texts) != old_version
+    assert bot_data['study_plan_index'].texts is texts
+    assert {bot_data['course_table'].row(i)['program'] for i in range(len(bot_data['course_table']))} == {"ai_product"}
+    # Кэш ответов, полученных по старым учебным планам, сбрасывается
+    assert cache.get("Какие есть курсы?", bot_data['plan_version']) is None
@@ -0,0 +1,67 @@
+import re
+
+import pytest
+
+from retrieval import StudyPlanIndex, estimate_tokens, split_into_chunks
+
+PLAN_TEXT = """ОП Искусственный интеллектСеместры старта
+Пул выборных дисциплин. 1 семестр 12432
+1Компьютерное зрение 3108
+1Компьютерное зрение в медицине 3108
+1Компьютерное зрение для роботов 3108
+1Базы данных 3108
+Обязательные дисциплины. 2 семестр 6216
+2Иностранный язык 3108
+2Философия и методология науки 3108
+2Математическая статистика 3108
+"""
+
+
+def parts(context: str) -> list:
+    """Разбивает контекст на отдельные фрагменты (каждый начинается с заголовка в скобках)."""
+    return re.split(r"\n\n(?=\[)", context)
+
+
+@pytest.fixture(scope="module")
+def index():
+    return StudyPlanIndex({"10033-abit.pdf": PLAN_TEXT})
+
+
+def test_split_into_sections_and_courses():
+    chunks = split_into_chunks("10033-abit.pdf", PLAN_TEXT)
+    sections = [chunk for chunk in chunks if chunk.parent is None]
+    courses = [chunk for chunk in chunks if chunk.parent is not None]
+    assert len(sections) == 2 and len(courses) == 7
+    assert all(course.parent.contains(course) for course in courses)
+    assert PLAN_TEXT[courses[0].start:courses[0].end] == "1Компьютерное зрение 3108"
+    assert courses[0].title == "Искусственный интеллект / Пул выборных дисциплин. 1 семестр 12432"
+
+
+def test_search_ranks_best_match_first(index):
+    results = index.search("иностранный язык", top_k=3)
+    assert 0 < len(results) <= 3
+    assert [score for score, _ in results] == sorted((score for score, _ in results), reverse=True)
+    assert index.texts[results[0][1].doc][results[0][1].start:results[0][1].end] == "2Иностранный язык 3108"
+
+
+def test_section_absorbs_its_courses(index):
+    context = index.build_context("компьютерное зрение", top_k=4, token_budget=3000)
+    # Три дисциплины одного раздела заменены фрагментом всего раздела, строки не повторяются
+    assert context.count("Компьютерное зрение в медицине") == 1
+    assert "1Базы данных 3108" in context
+    assert "Иностранный язык" not in context
+
+
+@pytest.mark.parametrize("budget", [20, 40, 80, 3000])
+def test_context_fits_token_budget(index, budget):
+    context = index.build_context("компьютерное зрение статистика язык", token_budget=budget)
+    if context:
+        assert sum(estimate_tokens(part) for part in parts(context)) <= budget
+
+
+def test_fallback_to_sections_when_nothing_matches(index):
+    context = index.build_context("квантовая гравитация", token_budget=3000)
+    assert parts(context)[0].startswith("[Искусственный интеллект]\nОП Искусственный интеллект")
+    assert "2Математическая статистика 3108" in context
+    # С небольшим бюджетом помещается только один раздел
+    assert len(parts(index.build_context("квантовая гравитация", token_budget=80))) == 1
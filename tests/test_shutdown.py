@@ -0,0 +1,47 @@
+import asyncio
+
+import bot
+from delivery import OutboundScheduler
+
+
+class FakeApplication:
+    def __init__(self, bot_data: dict):
+        self.bot_data = bot_data
+
+
+async def sent(text, delay=0.0):
+    await asyncio.sleep(delay)
+    return text
+
+
+def test_scheduler_stop_drains_queues_then_cancels():
+    async def test():
+        scheduler = OutboundScheduler()
+        delivered = scheduler.submit(1, lambda: sent("готово", 0.05))
+        stuck = scheduler.submit(2, lambda: sent("зависло", 10))
+        await scheduler.stop(timeout=0.2)
+        return delivered, stuck, scheduler
+
+    delivered, stuck, scheduler = asyncio.run(test())
+    assert delivered.result() == "готово"
+    assert stuck.cancelled()
+    assert scheduler.workers == {} and scheduler.queues == {}
+
+
+def test_shutdown_leaves_no_pending_tasks():
+    async def test():
+        scheduler = OutboundScheduler()
+        bot_data = {
+            'warm_up_task': asyncio.create_task(asyncio.sleep(10)),
+            'outbound_scheduler': scheduler,
+        }
+        reply = scheduler.submit(1, lambda: sent("ответ", 0.05))
+        await asyncio.sleep(0)
+        await bot.on_shutdown(FakeApplication(bot_data))
+        others = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return bot_data['warm_up_task'], reply, others
+
+    warm_up_task, reply, others = asyncio.run(test())
+    assert warm_up_task.cancelled()
+    assert reply.result() == "ответ"
+    assert others == []
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight, flight_key
+
+
+def test_flight_key_normalizes_question():
+    assert flight_key("Какие  экзамены?", "контекст") == flight_key("какие экзамены", "контекст")
+    assert flight_key("Какие экзамены?", "контекст") != flight_key("Какие экзамены?", "другой контекст")
+
+
+def test_concurrent_calls_share_one_request():
+    calls = 0
+
+    async def request():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    async def test():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(*(single_flight.do("key", request) for _ in range(5)))
+        return single_flight, results
+
+    single_flight, results = asyncio.run(test())
+    assert calls == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == "ответ" for result, _ in results)
+    assert single_flight.stats() == {'calls': 1, 'saved': 4, 'in_flight': 0}
+
+
+def test_exception_is_shared_with_followers():
+    async def request():
+        await asyncio.sleep(0.01)
+        raise ValueError("ошибка")
+
+    async def test():
+        single_flight = SingleFlight()
+        return await asyncio.gather(*(single_flight.do("key", request) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(test()))
+
+
+def test_followers_rerun_request_when_leader_is_cancelled():
+    calls = 0
+
+    async def request():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    async def test():
+        single_flight = SingleFlight()
+        leader = asyncio.create_task(single_flight.do("key", request))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(single_flight.do("key", request)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return single_flight, await asyncio.gather(*followers)
+
+    single_flight, results = asyncio.run(test())
+    assert [result for result, _ in results] == ["ответ"] * 3
+    # Один из ожидающих стал ведущим, остальные присоединились к нему
+    assert calls == 2
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert single_flight.stats() == {'calls': 2, 'saved': 2, 'in_flight': 0}
+
+
+def test_cancelled_follower_does_not_cancel_request():
+    async def request():
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    async def test():
+        single_flight = SingleFlight()
+        leader = asyncio.create_task(single_flight.do("key", request))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight.do("key", request))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(test()) == ("ответ", False)
@@ -0,0 +1,94 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+from reloader import build_corpus
+from snapshot import load_snapshot, write_snapshot
+from webhook import handle_webhook_connection
+
+AI_TEXT = """ОП Искусственный интеллектСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Обязательные дисциплины. 1 семестр 12432
+1Машинное обучение 6216
+2Иностранный язык 3108
+Пул выборных дисциплин. 1 семестр 12432
+1Компьютерное зрение 3108
+1Глубокое обучение нейронных сетей 3108
+"""
+PRODUCT_TEXT = """ОП Управление ИИ-продуктами/AI ProductСеместры старта
+Блок 1. Модули (дисциплины) 722592
+Пул выборных дисциплин. 2 семестр 12432
+2Стратегический продуктовый менеджмент 3108
+2Основы маркетинга для ИИ-продуктов 3108
+"""
+QUESTIONS = ["машинное обучение", "маркетинг продукта", "неизвестное слово", "Какие дисциплины во 2 семестре ai_product?"]
+
+
+def test_snapshot_round_trip_reads_structures_in_place(tmp_path):
+    corpus = build_corpus({"10033-abit.pdf": AI_TEXT, "10130-abit.pdf": PRODUCT_TEXT})
+    path = str(tmp_path / "snapshot.bin")
+    write_snapshot(path, corpus)
+    loaded = load_snapshot(path)
+
+    index, loaded_index = corpus['study_plan_index'], loaded['study_plan_index']
+    assert isinstance(loaded_index.posting_chunks, memoryview)
+    for question in QUESTIONS:
+        assert loaded_index.build_context(question, token_budget=100) == index.build_context(question, token_budget=100)
+        assert [(score, chunk.title) for score, chunk in loaded_index.search(question)] == \
+            [(score, chunk.title) for score, chunk in index.search(question)]
+        assert loaded['course_table'].answer(question) == corpus['course_table'].answer(question)
+
+    table = loaded['course_table']
+    assert isinstance(table.course, memoryview) and len(table) == 6
+    assert [table.row(i) for i in range(len(table))] == [corpus['course_table'].row(i) for i in range(len(table))]
+
+    if corpus['recommender'] is not None:
+        for question in QUESTIONS:
+            assert loaded['recommender'].recommend(question) == corpus['recommender'].recommend(question)
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(b"\x80\x05not a snapshot")
+    with pytest.raises(Exception):
+        load_snapshot(str(path))
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+
+
+async def post_webhook(application, request: bytes) -> bytes:
+    server = await asyncio.start_server(partial(handle_webhook_connection, application, "/telegram", None), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    response = await reader.readuntil(b"\r\n\r\n")
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return response
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-5"])
+def test_webhook_rejects_bad_content_length(content_length):
+    request = f"POST /telegram HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n".encode('ascii')
+    assert asyncio.run(post_webhook(FakeApplication(), request)).startswith(b"HTTP/1.1 400")
+
+
+@pytest.mark.parametrize("body, status", [
+    (b"[]", 400), (b"1", 400), (b'"x"', 400), (b"null", 400), (b"{}", 400), (b"{", 400),
+    (b'{"update_id": 1}', 200),
+])
+def test_webhook_answers_every_body(body, status):
+    async def test():
+        application = FakeApplication()
+        request = f"POST /telegram HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(body)}\r\n\r\n".encode('ascii') + body
+        return await post_webhook(application, request), application.update_queue.qsize()
+
+    response, queued = asyncio.run(test())
+    assert response.startswith(f"HTTP/1.1 {status}".encode('ascii'))
+    assert queued == (1 if status == 200 else 0)
@@ -0,0 +1,49 @@
+import asyncio
+
+from benchmark import FakeMessage
+from delivery import OutboundScheduler
+from streaming import StreamingReply
+
+
+class CountingScheduler(OutboundScheduler):
+    """Планировщик, который считает отправленные через него запросы."""
+
+    def __init__(self):
+        super().__init__(global_rate=1000, chat_rate=1000, chat_burst=1000)
+        self.submitted = 0
+
+    def submit(self, chat_id, send):
+        self.submitted += 1
+        return super().submit(chat_id, send)
+
+
+async def fragments(texts):
+    for text in texts:
+        yield text
+
+
+def test_streaming_calls_go_through_scheduler():
+    async def test():
+        message = FakeMessage()
+        scheduler = CountingScheduler()
+        reply = StreamingReply(message, max_length=20, edit_interval=0.0, scheduler=scheduler, chat_id=1)
+        text = await reply.consume(fragments(["Первая часть ответа. ", "Вторая часть ответа. ", "Конец."]))
+        return message, scheduler, text
+
+    message, scheduler, text = asyncio.run(test())
+    assert text == "Первая часть ответа. Вторая часть ответа. Конец."
+    # Заглушка и сообщения-продолжения отправлены, редактирования выполнены - все через планировщик
+    assert len(message.replies) >= 2
+    assert scheduler.submitted >= len(message.replies) + 1
+
+
+def test_streaming_failure_before_first_fragment_is_scheduled():
+    async def test():
+        message = FakeMessage()
+        scheduler = CountingScheduler()
+        await StreamingReply(message, max_length=100, scheduler=scheduler, chat_id=1).fail("Ошибка")
+        return message, scheduler
+
+    message, scheduler = asyncio.run(test())
+    assert message.replies == ["Ошибка"]
+    assert scheduler.submitted == 1
@@ -0,0 +1,227 @@
+import os
+import hmac
+import json
+import signal
+import socket
+import asyncio
+import logging
+import multiprocessing
+from functools import partial
+
+from telegram import Update
+from telegram.ext import Application
+
+from pdf_processor import process_study_plans
+from reloader import StudyPlanWatcher, build_corpus
+from snapshot import SnapshotWatcher, load_snapshot, write_snapshot, DEFAULT_SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер тела запроса с обновлением Telegram
+MAX_UPDATE_SIZE = 1024 * 1024
+
+# Как часто главный процесс проверяет, что рабочие процессы живы (в секундах)
+SUPERVISE_INTERVAL = 1.0
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large"}
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, keep_alive: bool) -> None:
+    body = HTTP_REASONS[status].encode('ascii')
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        f"Content-Type: text/plain\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('ascii') + body
+    )
+    await writer.drain()
+
+
+async def handle_webhook_connection(application: Application, path: str, secret: str | None,
+                                    reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Принимает запросы Telegram на одном соединении (с поддержкой keep-alive) и
+    ставит полученные обновления в очередь приложения. Ответ отправляется сразу,
+    не дожидаясь обработки обновления.
+    """
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get('connection', '').lower() != 'close'
+
+            try:
+                length = int(headers.get('content-length', 0) or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # Без корректной длины нельзя найти конец тела, поэтому соединение закрывается
+                await _respond(writer, 400, False)
+                return
+            if length > MAX_UPDATE_SIZE:
+                await _respond(writer, 413, False)
+                return
+            body = await reader.readexactly(length)
+
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != 'POST' or parts[1].split('?')[0] != path:
+                status = 404
+            elif secret and not hmac.compare_digest(headers.get('x-telegram-bot-api-secret-token', ''), secret):
+                status = 403
+            else:
+                try:
+                    data = json.loads(body)
+                    if not isinstance(data, dict):
+                        raise ValueError("обновление должно быть объектом JSON")
+                    update = Update.de_json(data, application.bot)
+                except (ValueError, TypeError, AttributeError) as e:
+                    logger.warning(f"Не удалось разобрать обновление Telegram: {e}")
+                    status = 400
+                else:
+                    await application.update_queue.put(update)
+                    status = 200
+            await _respond(writer, status, keep_alive)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve_worker(application: Application, sock: socket.socket, path: str, secret: str | None) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        server = await asyncio.start_server(partial(handle_webhook_connection, application, path, secret), sock=sock)
+        async with server:
+            await stop.wait()
+        await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def run_worker(application_factory, sock: socket.socket, worker_index: int, snapshot_path: str,
+               path: str, secret: str | None, reload_interval: float) -> None:
+    """
+    Рабочий процесс: отображает снимок учебных планов в память, создает
+    приложение и обрабатывает обновления, поступающие на общий сокет.
+    """
+    application = application_factory()
+    application.bot_data.update(load_snapshot(snapshot_path))
+    if reload_interval > 0:
+        application.bot_data['study_plan_watcher'] = SnapshotWatcher(application.bot_data, snapshot_path, reload_interval)
+    # У каждого рабочего процесса свои метрики и свой порт для них
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        metrics_server.port += worker_index
+    logger.info(f"Рабочий процесс {worker_index} (pid {os.getpid()}) запущен.")
+    asyncio.run(_serve_worker(application, sock, path, secret))
+
+
+async def _set_webhook(application: Application, url: str, secret: str | None) -> None:
+    async with application.bot:
+        await application.bot.set_webhook(url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+
+
+async def _supervise(workers: list, start_worker, watcher: StudyPlanWatcher | None) -> None:
+    """Перезапускает завершившиеся рабочие процессы и следит за учебными планами до сигнала остановки."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    if watcher is not None:
+        watcher.start()
+    try:
+        while not stop.is_set():
+            for index, process in enumerate(workers):
+                if not process.is_alive():
+                    logger.warning(f"Рабочий процесс {index} завершился с кодом {process.exitcode}, перезапуск.")
+                    workers[index] = start_worker(index)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=SUPERVISE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if watcher is not None:
+            await watcher.stop()
+
+
+def run_webhook_workers(application_factory, url: str, listen: str = "0.0.0.0", port: int = 8443,
+                        workers: int | None = None, secret: str | None = None, path: str = "/telegram",
+                        snapshot_path: str = DEFAULT_SNAPSHOT_PATH, pdf_dir: str = "study_plans",
+                        reload_interval: float = 0.0) -> None:
+    """
+    Запускает бота в режиме webhook с несколькими рабочими процессами.
+
+    Главный процесс извлекает учебные планы, сохраняет их вместе с поисковым
+    индексом и таблицей дисциплин в снимок, открывает слушающий сокет,
+    регистрирует webhook и запускает рабочие процессы. Рабочие процессы
+    принимают соединения с общего сокета (ядро распределяет их между
+    процессами) и отображают снимок в память только для чтения, поэтому тексты
+    учебных планов не копируются в каждый процесс. Если учебные планы
+    изменяются, главный процесс перезаписывает снимок, а рабочие процессы
+    подхватывают его.
+
+    Аргументы:
+    application_factory: Функция без аргументов, создающая Application без Updater.
+    url (str): Публичный HTTPS-адрес webhook, который регистрируется в Telegram.
+    listen (str): Адрес, на котором принимаются соединения.
+    port (int): Порт, на котором принимаются соединения.
+    workers (int | None): Количество рабочих процессов (None - по числу ядер).
+    secret (str | None): Секретный токен, который Telegram передает в заголовке запроса.
+    path (str): Путь запросов Telegram.
+    snapshot_path (str): Путь к файлу снимка учебных планов.
+    pdf_dir (str): Директория с PDF-файлами учебных планов.
+    reload_interval (float): Интервал проверки изменений учебных планов (0 - не проверять).
+    """
+    workers = workers or os.cpu_count() or 1
+
+    study_plan_texts = process_study_plans(pdf_dir)
+    if not study_plan_texts:
+        logger.warning("Не удалось загрузить учебные планы. Бот будет работать без контекста PDF.")
+    corpus = build_corpus(study_plan_texts)
+    write_snapshot(snapshot_path, corpus)
+    del corpus, study_plan_texts
+    # Главный процесс сам сообщения не обрабатывает: при изменении учебных планов он только перезаписывает снимок
+    watcher = None
+    if reload_interval > 0:
+        watcher = StudyPlanWatcher({}, pdf_dir, reload_interval, on_reload=partial(write_snapshot, snapshot_path))
+
+    sock = socket.create_server((listen, port), backlog=1024)
+    asyncio.run(_set_webhook(application_factory(), url, secret))
+
+    def start_worker(index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(application_factory, sock, index, snapshot_path, path, secret, reload_interval),
+            name=f"bot-worker-{index}",
+        )
+        process.start()
+        return process
+
+    processes = [start_worker(index) for index in range(workers)]
+    print(f"Бот запущен в режиме webhook на {listen}:{port}{path}, рабочих процессов: {workers}.")
+    try:
+        asyncio.run(_supervise(processes, start_worker, watcher))
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        sock.close()